@@ -0,0 +1,128 @@
+"""
+Admission control and shared resource limits.
+
+All Streamlit sessions (and API worker threads) run in one process, so the
+limits below are process-wide:
+
+    - AdmissionController: a FIFO queue of analyses with a global cap on how
+      many run at once and a per-user cap on how many one user may have
+      queued or running. Waiting callers can poll their queue position.
+    - cpu_slot(): bounds concurrent CPU-heavy stages (pdfminer layout,
+      highlighting, page splitting).
+    - llm_slot(): bounds concurrent outbound Gemini calls, including the
+      parallel calls of chunked extraction.
+
+Limits come from environment variables:
+    LEGAL_VERIFIER_MAX_ANALYSES     analyses running at once (default 2)
+    LEGAL_VERIFIER_PER_USER_CAP     analyses queued/running per user (default 1; the app
+                                    keys users by login, else client address)
+    LEGAL_VERIFIER_CPU_CONCURRENCY  concurrent CPU stages (default: CPU count)
+    LEGAL_VERIFIER_LLM_CONCURRENCY  concurrent Gemini calls (default 4)
+"""
+import os
+import itertools
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+MAX_ANALYSES = int(os.environ.get("LEGAL_VERIFIER_MAX_ANALYSES", "2"))
+PER_USER_CAP = int(os.environ.get("LEGAL_VERIFIER_PER_USER_CAP", "1"))
+CPU_CONCURRENCY = int(os.environ.get("LEGAL_VERIFIER_CPU_CONCURRENCY", str(os.cpu_count() or 2)))
+LLM_CONCURRENCY = int(os.environ.get("LEGAL_VERIFIER_LLM_CONCURRENCY", "4"))
+
+_cpu_semaphore = threading.BoundedSemaphore(max(1, CPU_CONCURRENCY))
+_llm_semaphore = threading.BoundedSemaphore(max(1, LLM_CONCURRENCY))
+
+@contextmanager
+def cpu_slot():
+    """Holds one of the process-wide CPU stage slots."""
+    with _cpu_semaphore:
+        yield
+
+@contextmanager
+def llm_slot():
+    """Holds one of the process-wide outbound LLM call slots."""
+    with _llm_semaphore:
+        yield
+
+class AdmissionError(Exception):
+    """Raised when a user already has as many analyses as PER_USER_CAP allows."""
+
+class AdmissionController:
+    """Fair (FIFO) admission queue with global and per-user limits."""
+
+    def __init__(self, max_running=MAX_ANALYSES, per_user_cap=PER_USER_CAP):
+        self.max_running = max(1, max_running)
+        self.per_user_cap = max(1, per_user_cap)
+        self._cond = threading.Condition()
+        self._waiting = deque() # tickets in arrival order
+        self._running = set()
+        self._owner = {} # ticket -> user_id
+        self._ids = itertools.count(1)
+
+    def enqueue(self, user_id):
+        """
+        Joins the queue. Returns a ticket for wait()/position()/release().
+
+        Raises:
+            AdmissionError: If the user is at their per-user cap.
+        """
+        with self._cond:
+            active = sum(1 for owner in self._owner.values() if owner == user_id)
+            if active >= self.per_user_cap:
+                raise AdmissionError(
+                    f"You already have {active} analysis(es) in progress "
+                    f"(limit {self.per_user_cap}). Please wait for it to finish."
+                )
+            ticket = next(self._ids)
+            self._owner[ticket] = user_id
+            self._waiting.append(ticket)
+            self._admit()
+            return ticket
+
+    def _admit(self):
+        # Caller holds the lock. Head of the queue goes first -> FIFO fairness.
+        while self._waiting and len(self._running) < self.max_running:
+            self._running.add(self._waiting.popleft())
+        self._cond.notify_all()
+
+    def position(self, ticket):
+        """0 if admitted, otherwise 1-based position in the queue."""
+        with self._cond:
+            if ticket in self._running:
+                return 0
+            try:
+                return self._waiting.index(ticket) + 1
+            except ValueError:
+                return 0
+
+    def wait(self, ticket, timeout=None):
+        """Blocks until the ticket is admitted or timeout expires. Returns True if admitted."""
+        with self._cond:
+            return self._cond.wait_for(lambda: ticket in self._running, timeout=timeout)
+
+    def release(self, ticket):
+        """Leaves the queue or frees the running slot (safe to call either way)."""
+        with self._cond:
+            self._running.discard(ticket)
+            try:
+                self._waiting.remove(ticket)
+            except ValueError:
+                pass
+            self._owner.pop(ticket, None)
+            self._admit()
+
+    def stats(self):
+        with self._cond:
+            return {"running": len(self._running), "waiting": len(self._waiting)}
+
+_controller = None
+_controller_lock = threading.Lock()
+
+def get_controller():
+    """Returns the process-wide AdmissionController."""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController()
+        return _controller
@@ -0,0 +1,245 @@
+"""
+Headless HTTP API for Legal Document Verifier.
+
+Exposes extraction + highlighting without the Streamlit UI, for integration
+with document management systems. Jobs run on a bounded worker pool; when
+the pool and its queue are full, new uploads are rejected with 429 so the
+caller can back off.
+
+Endpoints:
+    POST /jobs              Body: raw PDF bytes. -> 202 {"job_id": ...}
+                            429 if the queue is full, 413 if too large.
+    GET  /jobs/<id>         -> {"status": "queued"|"running"|"done"|"failed", ...}
+    GET  /jobs/<id>/result  -> {"extracted_data": {...}, "citation_map": {...},
+                                "text_free_pages": [...]}  (pages needing OCR)
+    GET  /jobs/<id>/pdf     -> highlighted PDF (application/pdf)
+    GET  /health            -> {"status": "ok", "queued": n, "running": n}
+
+The Gemini API key is taken from the X-Gemini-Api-Key header or the
+GEMINI_API_KEY environment variable. If LEGAL_VERIFIER_API_TOKEN is set,
+requests must send "Authorization: Bearer <token>".
+
+Usage:
+    python api_server.py --port 8600 --workers 2 --max-queue 16
+"""
+import os
+import hmac
+import json
+import time
+import uuid
+import shutil
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from legal_extraction import extract_legal_data_hybrid, parse_extraction_json
+from highlight_evidence_pure import highlight_evidence_pure, evidence_from_extraction
+from page_cache import PageCache
+from admission import cpu_slot
+
+class JobManager:
+    """Runs analysis jobs on a bounded thread pool and tracks their state."""
+
+    def __init__(self, workers=2, max_queue=16, jobs_dir=None, job_ttl=3600):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.jobs_dir = jobs_dir or tempfile.mkdtemp(prefix="legal_api_jobs_")
+        self.job_ttl = job_ttl
+        self.page_cache = PageCache()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._jobs = {} # job_id -> dict
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+    def counts(self):
+        with self._lock:
+            queued = sum(1 for j in self._jobs.values() if j["status"] == "queued")
+            running = sum(1 for j in self._jobs.values() if j["status"] == "running")
+        return queued, running
+
+    def submit(self, pdf_bytes, api_key=None):
+        """Queues a job. Returns the job id, or None if the queue is full."""
+        self._purge_expired()
+        with self._lock:
+            active = sum(1 for j in self._jobs.values() if j["status"] in ("queued", "running"))
+            if active >= self.workers + self.max_queue:
+                return None
+            job_id = uuid.uuid4().hex
+            job_dir = os.path.join(self.jobs_dir, job_id)
+            os.makedirs(job_dir)
+            with open(os.path.join(job_dir, "input.pdf"), "wb") as f:
+                f.write(pdf_bytes)
+            self._jobs[job_id] = {
+                "status": "queued",
+                "dir": job_dir,
+                "submitted_at": time.time(),
+                "finished_at": None,
+                "error": None,
+            }
+        self._pool.submit(self._run, job_id, api_key)
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _set(self, job_id, **changes):
+        with self._lock:
+            self._jobs[job_id].update(changes)
+
+    def _run(self, job_id, api_key):
+        self._set(job_id, status="running", started_at=time.time())
+        job_dir = self.get(job_id)["dir"]
+        input_path = os.path.join(job_dir, "input.pdf")
+        output_path = os.path.join(job_dir, "highlighted.pdf")
+        try:
+            extracted_data = parse_extraction_json(extract_legal_data_hybrid(input_path, api_key=api_key))
+            text_free_pages = []
+            with cpu_slot():
+                citations = highlight_evidence_pure(
+                    input_path, output_path, evidence_from_extraction(extracted_data),
+                    page_cache=self.page_cache, text_free_pages=text_free_pages
+                )
+            with open(os.path.join(job_dir, "result.json"), "w") as f:
+                json.dump({
+                    "extracted_data": extracted_data,
+                    "citation_map": citations,
+                    "text_free_pages": text_free_pages,
+                }, f)
+            self._set(job_id, status="done", finished_at=time.time())
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self._set(job_id, status="failed", error=str(e), finished_at=time.time())
+
+    def _purge_expired(self):
+        """Drops finished jobs (and their files) older than job_ttl."""
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["finished_at"] and now - job["finished_at"] > self.job_ttl
+            ]
+            for job_id in expired:
+                shutil.rmtree(self._jobs.pop(job_id)["dir"], ignore_errors=True)
+
+def make_handler(manager, max_upload_bytes, api_token=None):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _authorized(self):
+            if not api_token:
+                return True
+            # Constant-time comparison; bytes so non-ASCII headers can't raise
+            supplied = self.headers.get("Authorization", "").encode("utf-8")
+            if hmac.compare_digest(supplied, f"Bearer {api_token}".encode("utf-8")):
+                return True
+            self._send_json(401, {"error": "Unauthorized"})
+            return False
+
+        def do_POST(self):
+            if not self._authorized():
+                return
+            if self.path.rstrip("/") != "/jobs":
+                return self._send_json(404, {"error": "Not found"})
+
+            length = int(self.headers.get("Content-Length") or 0)
+            if length <= 0:
+                return self._send_json(400, {"error": "Empty body; send the PDF bytes"})
+            if length > max_upload_bytes:
+                return self._send_json(413, {"error": f"Upload exceeds {max_upload_bytes} bytes"})
+            pdf_bytes = self.rfile.read(length)
+            if not pdf_bytes.startswith(b"%PDF"):
+                return self._send_json(400, {"error": "Body is not a PDF"})
+
+            job_id = manager.submit(pdf_bytes, api_key=self.headers.get("X-Gemini-Api-Key"))
+            if job_id is None:
+                return self._send_json(429, {"error": "Queue full, retry later"}, {"Retry-After": "5"})
+            self._send_json(202, {"job_id": job_id}, {"Location": f"/jobs/{job_id}"})
+
+        def do_GET(self):
+            if not self._authorized():
+                return
+            parts = [p for p in self.path.split("?")[0].split("/") if p]
+
+            if parts == ["health"]:
+                queued, running = manager.counts()
+                return self._send_json(200, {"status": "ok", "queued": queued, "running": running})
+
+            if len(parts) < 2 or parts[0] != "jobs":
+                return self._send_json(404, {"error": "Not found"})
+            job = manager.get(parts[1])
+            if not job:
+                return self._send_json(404, {"error": "Unknown job"})
+
+            if len(parts) == 2:
+                payload = {"job_id": parts[1], "status": job["status"]}
+                if job["error"]:
+                    payload["error"] = job["error"]
+                return self._send_json(200, payload)
+
+            if job["status"] != "done":
+                return self._send_json(409, {"error": f"Job is {job['status']}"})
+
+            if parts[2] == "result":
+                with open(os.path.join(job["dir"], "result.json"), "rb") as f:
+                    body = f.read()
+                content_type = "application/json"
+            elif parts[2] == "pdf":
+                with open(os.path.join(job["dir"], "highlighted.pdf"), "rb") as f:
+                    body = f.read()
+                content_type = "application/pdf"
+            else:
+                return self._send_json(404, {"error": "Not found"})
+
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless extraction/highlighting API.")
+    parser.add_argument("--host", default=os.environ.get("LEGAL_VERIFIER_API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("LEGAL_VERIFIER_API_PORT", "8600")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("LEGAL_VERIFIER_API_WORKERS", "2")),
+                        help="Documents analysed concurrently (default: 2)")
+    parser.add_argument("--max-queue", type=int, default=int(os.environ.get("LEGAL_VERIFIER_API_MAX_QUEUE", "16")),
+                        help="Jobs waiting beyond the running ones before 429 (default: 16)")
+    parser.add_argument("--max-upload-mb", type=float, default=50, help="Maximum PDF size (default: 50)")
+    parser.add_argument("--jobs-dir", default=None, help="Where job files are kept (default: temp dir)")
+    parser.add_argument("--job-ttl", type=int, default=3600, help="Seconds finished jobs are kept (default: 3600)")
+    args = parser.parse_args()
+
+    manager = JobManager(
+        workers=args.workers, max_queue=args.max_queue,
+        jobs_dir=args.jobs_dir, job_ttl=args.job_ttl
+    )
+    handler = make_handler(
+        manager, int(args.max_upload_mb * 1024 * 1024),
+        api_token=os.environ.get("LEGAL_VERIFIER_API_TOKEN")
+    )
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Legal Doc Verifier API on http://{args.host}:{args.port} "
+          f"({args.workers} workers, queue {args.max_queue})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
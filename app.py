@@ -4,13 +4,23 @@ import json
 import tempfile
 import time
 import base64
+import hashlib
+import uuid
 from pathlib import Path
 import shutil
 import streamlit.components.v1 as components
 
 # Import existing logic
-from legal_extraction import extract_legal_data
-from highlight_evidence_pure import highlight_evidence_pure
+from legal_extraction import (
+    extract_legal_data_hybrid, parse_extraction_json, DEFAULT_MODEL, PROMPT_VERSION
+)
+from highlight_evidence_pure import highlight_evidence_pure, evidence_from_extraction
+from highlight_evidence import highlight_evidence
+from corpus_index import CorpusIndex
+from result_store import ResultStore
+from page_cache import PageCache, diff_versions
+from admission import get_controller, cpu_slot, AdmissionError
+from profiling import profile_run, PROFILE_ENABLED
 
 st.set_page_config(layout="wide", page_title="Legal Doc Verifier")
 
@@ -82,6 +92,13 @@ PDF_DIR = os.path.join(os.getcwd(), "temp_pdfs")
 if not os.path.exists(PDF_DIR):
     os.makedirs(PDF_DIR)
 
+# Highlighting engines: "pypdf" (pdfminer layout, per-page cache, linearized
+# output) or "pymupdf" (single pass over all quotes, one incremental save)
+HIGHLIGHT_ENGINES = ["pypdf", "pymupdf"]
+DEFAULT_HIGHLIGHT_ENGINE = os.environ.get("LEGAL_VERIFIER_HIGHLIGHT_ENGINE", "pypdf")
+if DEFAULT_HIGHLIGHT_ENGINE not in HIGHLIGHT_ENGINES:
+    DEFAULT_HIGHLIGHT_ENGINE = "pypdf"
+
 # --- Session State ---
 if 'current_page' not in st.session_state:
     st.session_state.current_page = 1
@@ -101,12 +118,68 @@ if 'highlighted_filename' not in st.session_state:
 if 'uploaded_file_name' not in st.session_state:
     st.session_state.uploaded_file_name = None
 
+if 'upload_id' not in st.session_state:
+    st.session_state.upload_id = None
+
 if 'preview_filename' not in st.session_state:
     st.session_state.preview_filename = None
 
 if 'nav_count' not in st.session_state:
     st.session_state.nav_count = 0
 
+if 'doc_hash' not in st.session_state:
+    st.session_state.doc_hash = None
+
+if 'version_diff' not in st.session_state:
+    st.session_state.version_diff = None
+
+if 'text_free_pages' not in st.session_state:
+    st.session_state.text_free_pages = []
+
+if 'profile_path' not in st.session_state:
+    st.session_state.profile_path = None
+
+def client_identity():
+    """
+    Key for the per-user admission cap that survives refreshes and new tabs:
+    the logged-in user if authentication is configured, else the client's
+    address, else (neither available) this session.
+    """
+    try:
+        if st.user.is_logged_in:
+            return f"user:{st.user.email}"
+    except Exception:
+        pass  # No auth configured / older Streamlit
+    context = getattr(st, "context", None)
+    address = None
+    if context is not None:
+        # Behind a reverse proxy the socket peer is the proxy itself
+        headers = getattr(context, "headers", None) or {}
+        address = headers.get("X-Forwarded-For", "").split(",")[0].strip()
+        address = address or getattr(context, "ip_address", None)
+    if address:
+        return f"ip:{address}"
+    return f"session:{uuid.uuid4().hex}"
+
+if 'user_id' not in st.session_state:
+    # Identifies the user for per-user admission caps
+    st.session_state.user_id = client_identity()
+
+@st.cache_resource
+def get_corpus_index():
+    """Shared (cross-session) handle to the persistent corpus index."""
+    return CorpusIndex()
+
+@st.cache_resource
+def get_result_store():
+    """Shared (cross-session) handle to the persistent analysis result store."""
+    return ResultStore()
+
+@st.cache_resource
+def get_page_cache():
+    """Shared (cross-session) handle to the per-page layout/match cache."""
+    return PageCache()
+
 # --- UI Layout ---
 
 st.sidebar.title("📄 Legal Verifier")
@@ -167,26 +240,128 @@ if not secrets_api_key:
 # If secrets_api_key is set, no API section is shown at all
 
 
+def artifacts_exist(result):
+    """True if the highlighted PDF and split page files of a stored result are still on disk."""
+    highlighted = result.get("highlighted_filename")
+    page_base_name = result.get("page_base_name")
+    total_pages = result.get("total_pages") or 0
+    if not highlighted or not page_base_name:
+        return False
+    # Spot-check first and last page files so the check stays O(1)
+    paths = [os.path.join(PDF_DIR, highlighted)]
+    paths += [os.path.join(PDF_DIR, f"{page_base_name}_{n}.pdf") for n in {1, max(total_pages, 1)}]
+    return all(os.path.exists(p) for p in paths)
+
+def compute_version_diff(doc_hash, page_hashes):
+    """
+    Compares this document with the stored document sharing the most pages
+    (its likely previous revision). Returns the diff_versions() report plus
+    "previous_file", or None if there is no earlier revision.
+    """
+    try:
+        previous = get_result_store().find_previous_version(page_hashes, exclude_doc_hash=doc_hash)
+    except Exception as e:
+        print(f"Error looking up previous version: {e}")
+        return None
+    if not previous or not previous["page_hashes"]:
+        return None
+    report = diff_versions(previous["page_hashes"], page_hashes, previous["citation_map"])
+    report["previous_file"] = previous["file_name"]
+    return report
+
+def load_stored_analysis():
+    """
+    Loads a previous analysis of the current document from the result store.
+    Returns True if session state was populated (no recomputation needed).
+    """
+    doc_hash = st.session_state.doc_hash
+    if not doc_hash:
+        return False
+    stored = get_result_store().get(doc_hash, DEFAULT_MODEL, PROMPT_VERSION)
+    if not stored or not artifacts_exist(stored):
+        return False
+
+    st.session_state.extracted_data = stored["extracted_data"]
+    st.session_state.citation_map = stored["citation_map"]
+    st.session_state.highlighted_filename = stored["highlighted_filename"]
+    st.session_state.page_base_name = stored["page_base_name"]
+    st.session_state.total_pages = stored["total_pages"]
+    st.session_state.version_diff = compute_version_diff(doc_hash, stored["page_hashes"])
+    st.session_state.text_free_pages = stored["text_free_pages"]
+    st.session_state.analysis_complete = True
+    return True
+
+highlight_engine = st.sidebar.selectbox(
+    "Highlighting engine",
+    HIGHLIGHT_ENGINES,
+    index=HIGHLIGHT_ENGINES.index(DEFAULT_HIGHLIGHT_ENGINE),
+    help="pymupdf is faster on large documents; pypdf reuses unchanged pages of earlier revisions."
+)
+
+profile_enabled = st.sidebar.checkbox(
+    "Profile analysis",
+    value=PROFILE_ENABLED,
+    help="Writes a flamegraph-compatible profile (.folded) next to the document's artifacts. "
+         "Slow runs are profiled automatically."
+)
+
 uploaded_file = st.sidebar.file_uploader("Upload Contract (PDF)", type=["pdf"])
 
 # Immediate save for preview
 if uploaded_file:
-    # Check if we need to save (new upload)
-    if st.session_state.uploaded_file_name != uploaded_file.name:
+    # Check if we need to save (new upload). Revisions are usually uploaded
+    # under the same name, so compare the upload id, not the file name.
+    upload_id = getattr(uploaded_file, "file_id", None) or hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+    if st.session_state.upload_id != upload_id:
+        st.session_state.upload_id = upload_id
         st.session_state.uploaded_file_name = uploaded_file.name
         st.session_state.analysis_complete = False
         st.session_state.highlighted_filename = None
+        st.session_state.page_base_name = None
         st.session_state.extracted_data = {}
         st.session_state.citation_map = {}
+        st.session_state.version_diff = None
+        st.session_state.text_free_pages = []
+        st.session_state.profile_path = None
+        st.session_state.doc_hash = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
         
         # Save for preview serving
         # Use a safe name to avoid weird URL chars
-        safe_preview_name = f"preview_{int(time.time())}.pdf"
+        safe_preview_name = f"preview_{uuid.uuid4().hex}.pdf"
         preview_path = os.path.join(PDF_DIR, safe_preview_name)
         with open(preview_path, "wb") as f:
             f.write(uploaded_file.getbuffer())
         
         st.session_state.preview_filename = safe_preview_name
+        
+        # Reopening a document we already analysed needs no recomputation
+        load_stored_analysis()
+
+def extract_data(input_path):
+    """Runs Gemini extraction and parses the JSON. Returns a dict, or None after showing an error."""
+    # Check for API key
+    api_key = st.session_state.get("api_key", "")
+    if not api_key:
+        st.error("⚠️ Please enter your Gemini API key in the sidebar first.")
+        return None
+    
+    try:
+        # Rule-based extractor first; Gemini (chunked for long documents)
+        # only for fields it cannot resolve
+        json_str = extract_legal_data_hybrid(input_path, model_name=DEFAULT_MODEL, api_key=api_key)
+        
+        print("--- RAW GEMINI RESPONSE ---")
+        print(json_str)
+        
+        extracted_data = parse_extraction_json(json_str)
+    except ValueError as e:
+        st.error(str(e))
+        return None
+    except Exception as e:
+        st.error(f"Extraction failed: {e}")
+        return None
+    
+    return extracted_data
 
 def run_analysis():
     if not uploaded_file or not st.session_state.preview_filename:
@@ -196,94 +371,177 @@ def run_analysis():
     if st.session_state.analysis_complete:
         return
 
+    # Previously analysed (same file content, model and prompt) -> just load it
+    if load_stored_analysis():
+        return
+
+    # Admission control: wait for a global slot (FIFO across all sessions)
+    controller = get_controller()
+    try:
+        ticket = controller.enqueue(st.session_state.user_id)
+    except AdmissionError as e:
+        st.warning(str(e))
+        return
+    
+    queue_status = st.empty()
+    try:
+        while not controller.wait(ticket, timeout=1.0):
+            queue_status.info(f"⏳ Waiting for a free slot: position {controller.position(ticket)} in queue")
+        queue_status.empty()
+        # Profile only the admitted run, not the time spent queueing
+        with profile_run(st.session_state.uploaded_file_name or "document", PDF_DIR,
+                         force=profile_enabled) as capture:
+            analyze_document()
+        st.session_state.profile_path = capture.path
+    finally:
+        controller.release(ticket)
+
+def analyze_document():
+    """Runs extraction, highlighting and page splitting for the current upload."""
     with st.spinner("⏳ Analyzing document with Gemini & highlighting evidence..."):
         # Input path is the preview file we already saved
         input_path = os.path.join(PDF_DIR, st.session_state.preview_filename)
         
-        # Check for API key
-        api_key = st.session_state.get("api_key", "")
-        if not api_key:
-            st.error("⚠️ Please enter your Gemini API key in the sidebar first.")
-            return
-        
         # A. Extract Data
-        try:
-            json_str = extract_legal_data(input_path, api_key=api_key)
-            
-            print("--- RAW GEMINI RESPONSE ---")
-            print(json_str)
-            
-            cleaned_json = json_str.strip()
-            if cleaned_json.startswith("```json"):
-                cleaned_json = cleaned_json[7:]
-            if cleaned_json.endswith("```"):
-                cleaned_json = cleaned_json[:-3]
-            
-            try:
-                extracted_data = json.loads(cleaned_json)
-                
-                # Handle list wrapping (e.g. [{...}])
-                if isinstance(extracted_data, list):
-                    if len(extracted_data) > 0 and isinstance(extracted_data[0], dict):
-                        # Merge if multiple, or just take first? 
-                        # Usually it's just one object wrapped.
-                        temp_data = {}
-                        for item in extracted_data:
-                            if isinstance(item, dict):
-                                temp_data.update(item)
-                        extracted_data = temp_data
-                    else:
-                         st.error("Unexpected data format: List does not contain dictionaries.")
-                         return
-
-                if not isinstance(extracted_data, dict):
-                     st.error("Unexpected data format from AI. Expected dictionary.")
-                     return
-            except json.JSONDecodeError:
-                st.error("Invalid JSON received.")
+        # If only the artifacts were lost, reuse the stored extraction
+        stored = get_result_store().get(st.session_state.doc_hash, DEFAULT_MODEL, PROMPT_VERSION)
+        if stored:
+            extracted_data = stored["extracted_data"]
+        else:
+            extracted_data = extract_data(input_path)
+            if extracted_data is None:
                 return
-
-        except Exception as e:
-            st.error(f"Extraction failed: {e}")
-            return
             
         # B. Highlight & Map Pages
         # Construct evidence list for new API
-        evidence = []
-        for key, item in extracted_data.items():
-            if isinstance(item, dict):
-                evidence.append({
-                    "label": key,
-                    "quote": item.get('verbatim_quote'), 
-                    "gemini_page": item.get('page_number')
-                })
+        evidence = evidence_from_extraction(extracted_data)
         
-        safe_highlight_name = f"highlighted_{int(time.time())}.pdf"
+        # Unique per run: concurrent analyses share PDF_DIR and these names are
+        # stored as artifact pointers in the result store
+        artifact_id = f"{st.session_state.doc_hash[:16]}_{uuid.uuid4().hex[:8]}"
+        safe_highlight_name = f"highlighted_{artifact_id}.pdf"
         output_pdf_path = os.path.join(PDF_DIR, safe_highlight_name)
         
-        citations = highlight_evidence_pure(input_path, output_pdf_path, evidence)
+        page_texts = []
+        page_hashes = []
+        text_free_pages = []
+        with cpu_slot():
+            if highlight_engine == "pymupdf":
+                citations = highlight_evidence(
+                    input_path, output_pdf_path, evidence,
+                    page_texts=page_texts,
+                    page_hashes=page_hashes,
+                    text_free_pages=text_free_pages,
+                )
+            else:
+                citations = highlight_evidence_pure(
+                    input_path, output_pdf_path, evidence,
+                    page_texts=page_texts,
+                    page_cache=get_page_cache(),  # unchanged pages of earlier revisions are reused
+                    page_hashes=page_hashes,
+                    text_free_pages=text_free_pages,  # no text layer -> layout skipped
+                )
+        
+        # Add to the corpus index so this contract stays searchable
+        try:
+            get_corpus_index().add_document(
+                st.session_state.doc_hash, st.session_state.uploaded_file_name,
+                page_texts, extracted_data
+            )
+        except Exception as e:
+            print(f"Error indexing document: {e}")
         
         # --- SPLIT PDF INTO INDIVIDUAL PAGES ---
         from pypdf import PdfReader, PdfWriter
         reader = PdfReader(output_pdf_path)
-        page_base_name = f"page_{int(time.time())}"
+        page_base_name = f"page_{artifact_id}"
         
-        for i, page in enumerate(reader.pages):
-            writer = PdfWriter()
-            writer.add_page(page)
-            page_filename = f"{page_base_name}_{i+1}.pdf"
-            page_path = os.path.join(PDF_DIR, page_filename)
-            with open(page_path, "wb") as f:
-                writer.write(f)
+        with cpu_slot():
+            for i, page in enumerate(reader.pages):
+                writer = PdfWriter()
+                writer.add_page(page)
+                page_filename = f"{page_base_name}_{i+1}.pdf"
+                page_path = os.path.join(PDF_DIR, page_filename)
+                with open(page_path, "wb") as f:
+                    writer.write(f)
         
         st.session_state.extracted_data = extracted_data
         st.session_state.citation_map = citations
         st.session_state.highlighted_filename = safe_highlight_name
         st.session_state.page_base_name = page_base_name
         st.session_state.total_pages = len(reader.pages)
+        st.session_state.version_diff = compute_version_diff(st.session_state.doc_hash, page_hashes)
+        st.session_state.text_free_pages = text_free_pages
         st.session_state.analysis_complete = True
+        
+        # Persist so a refresh/restart can reload this without recomputation
+        try:
+            get_result_store().put(
+                st.session_state.doc_hash,
+                model=DEFAULT_MODEL,
+                prompt_version=PROMPT_VERSION,
+                extracted_data=extracted_data,
+                citation_map=citations,
+                highlighted_filename=safe_highlight_name,
+                page_base_name=page_base_name,
+                total_pages=len(reader.pages),
+                file_name=st.session_state.uploaded_file_name,
+                page_hashes=page_hashes,
+                text_free_pages=text_free_pages,
+            )
+        except Exception as e:
+            print(f"Error storing analysis result: {e}")
 
 
+def render_copy_panel(items):
+    """Renders copy-to-clipboard buttons for all fields in a single iframe.
+    
+    Args:
+        items: list of dicts [{"label": str, "value": str}]
+    """
+    if not items:
+        return
+    # Data is passed as JSON so values never need manual JS string escaping
+    payload = json.dumps(items).replace("</", "<\\/")
+    row_height = 30
+    with st.sidebar:
+        components.html(
+            f"""
+            <style>
+                body {{ margin: 0; font-family: sans-serif; font-size: 0.85rem; }}
+                .row {{ display: flex; align-items: center; justify-content: space-between;
+                        height: {row_height}px; border-bottom: 1px solid #eee; }}
+                .label {{ overflow: hidden; text-overflow: ellipsis; white-space: nowrap; }}
+                button {{ border: none; background: none; cursor: pointer; font-size: 1.1rem; }}
+            </style>
+            <div id="rows"></div>
+            <script>
+                const items = {payload};
+                const rows = document.getElementById("rows");
+                items.forEach((item) => {{
+                    const row = document.createElement("div");
+                    row.className = "row";
+                    const label = document.createElement("span");
+                    label.className = "label";
+                    label.textContent = item.label;
+                    const btn = document.createElement("button");
+                    btn.textContent = "📋";
+                    btn.title = "Copy '" + item.value + "'";
+                    btn.onclick = () => {{
+                        navigator.clipboard.writeText(item.value);
+                        btn.textContent = "✅";
+                        setTimeout(() => {{ btn.textContent = "📋"; }}, 1000);
+                    }};
+                    row.appendChild(label);
+                    row.appendChild(btn);
+                    rows.appendChild(row);
+                }});
+            </script>
+            """,
+            height=row_height * len(items) + 10,
+            scrolling=False,
+        )
+
 if uploaded_file:
     if st.sidebar.button("Analyze Document"):
         run_analysis()
@@ -293,8 +551,42 @@ if uploaded_file:
         st.sidebar.markdown("---")
         st.sidebar.subheader("📌 Extracted Data")
         
+        # Revision report: what changed since the previous version of this contract
+        version_diff = st.session_state.version_diff
+        if version_diff:
+            changed = version_diff["changed_pages"]
+            affected = version_diff["affected_fields"]
+            msg = f"🔁 Revision of **{version_diff['previous_file']}**  \n"
+            if changed or version_diff["removed_pages"]:
+                msg += f"Changed pages: {', '.join(map(str, changed)) or 'none (pages removed)'}  \n"
+                msg += f"Fields possibly affected: {', '.join(affected) or 'none'}"
+            else:
+                msg += "No page content changed."
+            st.sidebar.info(msg)
+        
+        if st.session_state.text_free_pages:
+            st.sidebar.warning(
+                "🖼️ Pages without a text layer (scanned/blank, not searched): "
+                + ", ".join(map(str, st.session_state.text_free_pages))
+            )
+        
+        if st.session_state.profile_path:
+            st.sidebar.caption(f"⏱️ Profile saved: {os.path.basename(st.session_state.profile_path)}")
+        
+        st.sidebar.caption("📋 Copy values")
+        
         data_dict = st.session_state.extracted_data
         
+        # All copy actions are rendered by ONE iframe that receives the field
+        # list as data, instead of one components.html() per field. This keeps
+        # rerun cost flat regardless of how many fields were extracted.
+        copy_items = []
+        for label, item in data_dict.items():
+            if not isinstance(item, dict): continue
+            val = item.get('value')
+            copy_items.append({"label": label, "value": "N/A" if val is None else str(val)})
+        render_copy_panel(copy_items)
+        
         for label, item in data_dict.items():
             if not isinstance(item, dict): continue
             
@@ -310,60 +602,62 @@ if uploaded_file:
             
             st.sidebar.markdown(f"**{label}**")
             
-            # Layout: [Nav Button (Original Style)] [Copy Code]
-            # Col 1: Wide button with "Value (Pg X)"
-            # Col 2: Narrow code block for copying just the value
-            col_nav, col_copy = st.sidebar.columns([0.85, 0.15])
+            # Reconstruct the original label with verification icon
+            # Verified: ✅ Value (Pg X)
+            # Unverified: ⚠️ Value (Approx Pg X)
+            # Missing: ❌ Value
             
-            with col_nav:
-                # Reconstruct the original label with verification icon
-                # Verified: ✅ Value (Pg X)
-                # Unverified: ⚠️ Value (Approx Pg X)
-                # Missing: ❌ Value
-                
-                btn_label = f"{val}"
-                
-                if page_num:
-                    if status == "verified":
-                        btn_label = f"✅ {val} (Pg {page_num})"
-                    elif status == "unverified":
-                        btn_label = f"⚠️ {val} (Approx Pg {page_num})"
-                    else:
-                         btn_label = f"{val} (Pg {page_num})"
-                else:
-                    btn_label += " ❌"
-
-                if st.button(btn_label, key=f"btn_{label}"):
-                    if page_num:
-                        st.session_state.current_page = page_num
-                        st.session_state.nav_count += 1
-                        st.session_state.needs_refresh = True
-                        st.session_state.view_whole_pdf = False  # Switch to single page mode
-                        st.rerun()
+            btn_label = f"{val}"
             
-            with col_copy:
-                 # Custom HTML/JS button to copy text without showing it
-                 # Escaping for JS string
-                 safe_val = val.replace("'", "\\'")
-                 components.html(
-                    f"""
-                    <div style="display: flex; align-items: center; justify-content: center; height: 100%;">
-                        <button onclick="copyToClipboard()" style="border: none; background: none; cursor: pointer; font-size: 1.2rem;" title="Copy '{safe_val}'">
-                            📋
-                        </button>
-                    </div>
-                    <script>
-                        function copyToClipboard() {{
-                            navigator.clipboard.writeText('{safe_val}');
-                        }}
-                    </script>
-                    """,
-                    height=40
-                 )
+            if page_num:
+                if status == "verified":
+                    btn_label = f"✅ {val} (Pg {page_num})"
+                elif status == "unverified":
+                    btn_label = f"⚠️ {val} (Approx Pg {page_num})"
+                else:
+                     btn_label = f"{val} (Pg {page_num})"
+            else:
+                btn_label += " ❌"
+
+            if st.sidebar.button(btn_label, key=f"btn_{label}"):
+                if page_num:
+                    st.session_state.current_page = page_num
+                    st.session_state.nav_count += 1
+                    st.session_state.needs_refresh = True
+                    st.session_state.view_whole_pdf = False  # Switch to single page mode
+                    st.rerun()
             
             st.sidebar.caption(f"\"{quote}\"")
             st.sidebar.markdown("---")
 
+# --- Corpus Search ---
+with st.sidebar.expander("🔎 Search Processed Contracts"):
+    corpus = get_corpus_index()
+    search_mode = st.radio("Search by", ["Text", "Field date"], horizontal=True, key="corpus_mode")
+    
+    if search_mode == "Text":
+        query = st.text_input("Search text", key="corpus_query")
+        if query:
+            t0 = time.perf_counter()
+            hits = corpus.search_text(query)
+            st.caption(f"{len(hits)} matches in {(time.perf_counter() - t0) * 1000:.0f} ms")
+            for hit in hits:
+                st.markdown(f"**{hit['file_name']}** (Pg {hit['page']})  \n{hit['snippet']}")
+    else:
+        labels = corpus.field_labels()
+        if not labels:
+            st.caption("No contracts indexed yet.")
+        else:
+            field = st.selectbox("Field", labels, key="corpus_field")
+            date_range = st.date_input("Date range", value=(), key="corpus_range")
+            start = date_range[0] if len(date_range) > 0 else None
+            end = date_range[1] if len(date_range) > 1 else None
+            t0 = time.perf_counter()
+            hits = corpus.find_by_field(field, start, end)
+            st.caption(f"{len(hits)} contracts in {(time.perf_counter() - t0) * 1000:.0f} ms")
+            for hit in hits:
+                st.markdown(f"**{hit['file_name']}**: {hit['value']} (Pg {hit['page']})")
+
 # --- Main View ---
 col1, col2 = st.columns([1, 10])
 
@@ -0,0 +1,88 @@
+"""
+Output PDF benchmark for Legal Document Verifier.
+
+Highlights a PDF with and without output optimization (compression +
+linearization) and compares file size, write time and time-to-first-page:
+how long a viewer takes to open the file and render page 1, and how many
+bytes it needs before it can (the first-page section of a linearized file,
+the whole file otherwise).
+
+Usage:
+    python bench_output.py contract.pdf
+    python bench_output.py contract.pdf --quote "Settlement Date" --repeat 10
+"""
+import argparse
+import os
+import re
+import statistics
+import tempfile
+import time
+
+from highlight_evidence_pure import highlight_evidence_pure
+
+def first_page_bytes(path):
+    """
+    Bytes a viewer must receive before page 1 can be shown: the /E offset of
+    the linearization dictionary, or the full size for non-linearized files.
+    """
+    with open(path, "rb") as f:
+        head = f.read(1024)
+    match = re.search(rb"/Linearized\b.*?/E\s+(\d+)", head, re.DOTALL)
+    if match:
+        return int(match.group(1)), True
+    return os.path.getsize(path), False
+
+def time_first_page(path, repeat):
+    """Median seconds for fitz to open the file and render page 1."""
+    import fitz
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        doc = fitz.open(path)
+        doc[0].get_pixmap()
+        doc.close()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+def run_case(pdf_path, evidence, optimize, out_dir, repeat):
+    output_path = os.path.join(out_dir, f"out_{'opt' if optimize else 'plain'}.pdf")
+    start = time.perf_counter()
+    highlight_evidence_pure(pdf_path, output_path, evidence, optimize=optimize)
+    write_time = time.perf_counter() - start
+
+    needed, linearized = first_page_bytes(output_path)
+    try:
+        render_time = time_first_page(output_path, repeat)
+    except ImportError:
+        render_time = None
+    return {
+        "size": os.path.getsize(output_path),
+        "write": write_time,
+        "first_page_bytes": needed,
+        "linearized": linearized,
+        "render": render_time,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark output PDF size and time-to-first-page.")
+    parser.add_argument("pdf", help="Input PDF")
+    parser.add_argument("--quote", default="Date", help="Text to highlight (default: 'Date')")
+    parser.add_argument("--repeat", type=int, default=5, help="First-page renders per case (default: 5)")
+    args = parser.parse_args()
+
+    evidence = [{"label": "Benchmark", "quote": args.quote, "gemini_page": None}]
+    with tempfile.TemporaryDirectory() as out_dir:
+        results = [
+            ("plain", run_case(args.pdf, evidence, False, out_dir, args.repeat)),
+            ("optimized", run_case(args.pdf, evidence, True, out_dir, args.repeat)),
+        ]
+
+    print(f"\n{'':10s} {'size':>10s} {'write':>9s} {'bytes to p1':>12s} {'render p1':>10s}  linearized")
+    for label, r in results:
+        render = f"{r['render'] * 1000:8.1f}ms" if r["render"] is not None else "       n/a"
+        print(f"  {label:8s} {r['size'] / 1024:8.1f}KB {r['write'] * 1000:7.0f}ms "
+              f"{r['first_page_bytes'] / 1024:10.1f}KB {render}  {'yes' if r['linearized'] else 'no'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Start-up benchmark for Legal Document Verifier.
+
+Measures the cost of importing the app modules (each in a fresh interpreter,
+so nothing is cached) and, optionally, how long the launcher takes until the
+Streamlit server answers its health check.
+
+With --baseline the numbers are compared with the previous start-up path:
+    - imports: the app modules plus the libraries they used to import at
+      module level (google.genai, pypdf, pdfminer), against today's lazy imports;
+    - browser: the fixed 4 s sleep the launcher used to wait before opening
+      the browser, against the measured health-check readiness;
+    - bundles: each --exe (e.g. a onefile and a onedir build) is started and
+      timed until ready, so the two layouts can be compared side by side.
+
+Usage:
+    python bench_startup.py                 # import times only
+    python bench_startup.py --server        # also time server readiness
+    python bench_startup.py --baseline --server
+    python bench_startup.py --exe dist/LegalDocVerifier.exe --exe dist/LegalDocVerifier/LegalDocVerifier.exe
+    python bench_startup.py --repeat 10
+"""
+import argparse
+import importlib.util
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (label, statement) pairs timed in a fresh interpreter each run.
+IMPORT_CASES = [
+    ("legal_extraction", "import legal_extraction"),
+    ("highlight_evidence_pure", "import highlight_evidence_pure"),
+    ("google.genai (deferred)", "from google import genai"),
+    ("pypdf + pdfminer (deferred)", "import pypdf, pdfminer.high_level"),
+    ("fitz (deferred)", "import fitz"),
+]
+
+APP_MODULES = ["legal_extraction", "highlight_evidence_pure"]
+# Imported at module level by the app modules before they were deferred
+EAGER_MODULES = ["google.genai", "pypdf", "pdfminer.high_level"]
+
+# The launcher used to sleep this long before opening the browser
+BASELINE_BROWSER_DELAY = 4.0
+
+def time_import(statement, repeat):
+    """Returns a list of wall-clock seconds for running `statement` in a new interpreter."""
+    code = (
+        "import time; t = time.perf_counter(); "
+        f"{statement}; "
+        "print(time.perf_counter() - t)"
+    )
+    samples = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=BASE_DIR, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            return None
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return samples
+
+def installed(module):
+    try:
+        return importlib.util.find_spec(module) is not None
+    except ImportError:  # parent package missing
+        return False
+
+def median_ms(samples):
+    return statistics.median(samples) * 1000
+
+def time_server_ready(command=None, timeout=120.0):
+    """
+    Starts the launcher (or a built bundle, if command is given) and returns
+    seconds until the health check succeeds, or None if it never does.
+    """
+    from launcher import wait_for_server
+
+    command = command or [sys.executable, os.path.join(BASE_DIR, "launcher.py")]
+    start = time.perf_counter()
+    env = dict(os.environ, BROWSER="true")  # Don't actually open a browser
+    proc = subprocess.Popen(
+        command, cwd=BASE_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        ready = wait_for_server(timeout=timeout, interval=0.05)
+        elapsed = time.perf_counter() - start
+    finally:
+        proc.terminate()
+        proc.wait()
+    return elapsed if ready else None
+
+def print_comparison(label, baseline, current, unit):
+    if baseline is None or current is None:
+        print(f"  {label:32s} {'n/a':>10s}")
+        return
+    change = (current - baseline) / baseline * 100 if baseline else 0.0
+    print(f"  {label:32s} {baseline:8.2f}{unit:3s} -> {current:8.2f}{unit:3s} ({change:+.0f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark import and start-up time.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (default: 5)")
+    parser.add_argument("--server", action="store_true", help="Also time launcher until server is ready")
+    parser.add_argument("--baseline", action="store_true",
+                        help="Compare with eager imports and the old fixed 4s browser delay")
+    parser.add_argument("--exe", action="append", default=[],
+                        help="Built bundle to time until ready (repeat to compare onefile/onedir)")
+    args = parser.parse_args()
+
+    print(f"Import times (median of {args.repeat} fresh interpreters):")
+    for label, statement in IMPORT_CASES:
+        samples = time_import(statement, args.repeat)
+        if samples is None:
+            print(f"  {label:32s} not installed")
+        else:
+            print(f"  {label:32s} {median_ms(samples):8.1f} ms")
+
+    if args.baseline:
+        print("\nBaseline (eager imports) -> current (lazy imports):")
+        modules = [m for m in EAGER_MODULES if installed(m)]
+        eager = time_import(f"import {', '.join(modules + APP_MODULES)}", args.repeat)
+        lazy = time_import(f"import {', '.join(APP_MODULES)}", args.repeat)
+        print_comparison("app modules", eager and median_ms(eager), lazy and median_ms(lazy), "ms")
+        missing = sorted(set(EAGER_MODULES) - set(modules))
+        if missing:
+            print(f"  (baseline understated: {', '.join(missing)} not installed)")
+
+    if args.server:
+        print("\nLauncher start-up:")
+        elapsed = time_server_ready()
+        if elapsed is None:
+            print("  Server did not become ready.")
+        elif args.baseline:
+            print_comparison("browser opens after", BASELINE_BROWSER_DELAY, elapsed, "s")
+        else:
+            print(f"  Server ready after {elapsed:.2f}s (previously a fixed 4s sleep before opening the browser)")
+
+    if args.exe:
+        print("\nBundle start-up (until the health check answers):")
+        for exe in args.exe:
+            elapsed = time_server_ready([os.path.abspath(exe)])
+            result = f"{elapsed:8.2f}s" if elapsed is not None else "not ready"
+            print(f"  {os.path.relpath(exe):32s} {result}")
+
+if __name__ == "__main__":
+    main()
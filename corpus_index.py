@@ -0,0 +1,227 @@
+"""
+Persistent corpus index for processed contracts.
+
+Stores the page text extracted by highlight_evidence_pure and the fields
+returned by extract_legal_data in a local SQLite database, so previously
+analysed contracts can be searched without re-opening their PDFs:
+
+    - Full-text search over page text (SQLite FTS5, LIKE fallback if FTS5
+      is not compiled in).
+    - Field queries, e.g. all contracts whose "Settlement Date" falls in a
+      date range (indexed on normalized label + ISO date).
+"""
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+
+from sqlite_util import connect
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".legal_verifier_index.db")
+
+# Formats we try when turning an extracted "value" into a sortable ISO date.
+# The extraction prompt asks for DD-MM-YYYY; the rest are common variants.
+DATE_FORMATS = ["%d-%m-%Y", "%d/%m/%Y", "%d.%m.%Y", "%Y-%m-%d", "%d %B %Y", "%d %b %Y", "%B %d, %Y"]
+
+def normalize_label(label):
+    """Lowercase and collapse whitespace so "Settlement  Date" == "settlement date"."""
+    return re.sub(r'\s+', ' ', str(label).strip().lower())
+
+def parse_date(value):
+    """Returns the value as an ISO date string (YYYY-MM-DD), or None if it is not a date."""
+    if not value or not isinstance(value, str):
+        return None
+    value = value.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+class CorpusIndex:
+    """SQLite-backed full-text and field index across processed documents."""
+
+    def __init__(self, db_path=DEFAULT_INDEX_PATH):
+        self.db_path = db_path
+        self.has_fts = False
+        self._init_schema()
+
+    def _init_schema(self):
+        with connect(self.db_path) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    doc_id TEXT PRIMARY KEY,
+                    file_name TEXT,
+                    page_count INTEGER,
+                    indexed_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS fields (
+                    doc_id TEXT NOT NULL,
+                    label TEXT NOT NULL,
+                    label_norm TEXT NOT NULL,
+                    value TEXT,
+                    date_iso TEXT,
+                    quote TEXT,
+                    page INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS idx_fields_label_date ON fields (label_norm, date_iso);
+                CREATE INDEX IF NOT EXISTS idx_fields_doc ON fields (doc_id);
+            """)
+            try:
+                conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5("
+                    "doc_id UNINDEXED, page UNINDEXED, text, tokenize='unicode61')"
+                )
+            except sqlite3.OperationalError:
+                # FTS5 not available in this SQLite build -> plain table + LIKE
+                conn.execute("CREATE TABLE IF NOT EXISTS pages (doc_id TEXT, page INTEGER, text TEXT)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_doc ON pages (doc_id)")
+            # Table may already exist from an earlier run; detect what it is.
+            row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'pages'").fetchone()
+            self.has_fts = bool(row and "fts5" in row[0].lower())
+
+    def add_document(self, doc_id, file_name, page_texts, extracted_data):
+        """
+        Indexes (or re-indexes) one document.
+
+        Args:
+            doc_id: Stable document identifier (content hash).
+            file_name: Original upload name, for display.
+            page_texts: list of page text strings, in page order.
+            extracted_data: dict {label: {"value", "verbatim_quote", "page_number"}}
+        """
+        with connect(self.db_path) as conn:
+            conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM pages WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM fields WHERE doc_id = ?", (doc_id,))
+
+            conn.execute(
+                "INSERT INTO documents (doc_id, file_name, page_count, indexed_at) VALUES (?, ?, ?, ?)",
+                (doc_id, file_name, len(page_texts), time.time())
+            )
+            conn.executemany(
+                "INSERT INTO pages (doc_id, page, text) VALUES (?, ?, ?)",
+                [(doc_id, i + 1, text) for i, text in enumerate(page_texts)]
+            )
+
+            rows = []
+            for label, item in (extracted_data or {}).items():
+                if not isinstance(item, dict):
+                    continue
+                value = item.get("value")
+                value = None if value is None else str(value)
+                page = item.get("page_number")
+                try:
+                    page = int(page) if page else None
+                except (TypeError, ValueError):
+                    page = None
+                rows.append((
+                    doc_id, label, normalize_label(label), value,
+                    parse_date(value), item.get("verbatim_quote"), page
+                ))
+            conn.executemany(
+                "INSERT INTO fields (doc_id, label, label_norm, value, date_iso, quote, page) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def search_text(self, query, limit=50):
+        """
+        Full-text search over indexed page text.
+
+        Returns:
+            list of dicts [{"doc_id", "file_name", "page", "snippet"}]
+        """
+        terms = query.split()
+        if not terms:
+            return []
+
+        with connect(self.db_path) as conn:
+            if self.has_fts:
+                # Quote every term so user input is never parsed as FTS syntax
+                match = " ".join('"' + t.replace('"', '""') + '"' for t in terms)
+                cur = conn.execute(
+                    "SELECT p.doc_id, d.file_name, p.page, snippet(pages, 2, '**', '**', '…', 12) "
+                    "FROM pages p JOIN documents d ON d.doc_id = p.doc_id "
+                    "WHERE pages MATCH ? ORDER BY rank LIMIT ?",
+                    (match, limit)
+                )
+            else:
+                where = " AND ".join("p.text LIKE ?" for _ in terms)
+                cur = conn.execute(
+                    "SELECT p.doc_id, d.file_name, p.page, substr(p.text, 1, 120) "
+                    "FROM pages p JOIN documents d ON d.doc_id = p.doc_id "
+                    f"WHERE {where} LIMIT ?",
+                    [f"%{t}%" for t in terms] + [limit]
+                )
+            return [
+                {"doc_id": r[0], "file_name": r[1], "page": r[2], "snippet": r[3]}
+                for r in cur.fetchall()
+            ]
+
+    def find_by_field(self, label, start=None, end=None, limit=500):
+        """
+        Finds documents whose field `label` has a date within [start, end].
+
+        Args:
+            label: Field name (case/whitespace insensitive), e.g. "Settlement Date".
+            start, end: datetime.date or ISO string bounds (inclusive); either may be None.
+
+        Returns:
+            list of dicts [{"doc_id", "file_name", "label", "value", "date", "page"}]
+        """
+        sql = (
+            "SELECT f.doc_id, d.file_name, f.label, f.value, f.date_iso, f.page "
+            "FROM fields f JOIN documents d ON d.doc_id = f.doc_id "
+            "WHERE f.label_norm = ? AND f.date_iso IS NOT NULL"
+        )
+        params = [normalize_label(label)]
+        if start:
+            sql += " AND f.date_iso >= ?"
+            params.append(str(start))
+        if end:
+            sql += " AND f.date_iso <= ?"
+            params.append(str(end))
+        sql += " ORDER BY f.date_iso LIMIT ?"
+        params.append(limit)
+
+        with connect(self.db_path) as conn:
+            return [
+                {"doc_id": r[0], "file_name": r[1], "label": r[2], "value": r[3], "date": r[4], "page": r[5]}
+                for r in conn.execute(sql, params).fetchall()
+            ]
+
+    def field_labels(self):
+        """Returns the distinct field labels in the index (most common first)."""
+        with connect(self.db_path) as conn:
+            rows = conn.execute(
+                "SELECT MIN(label), COUNT(*) AS n FROM fields GROUP BY label_norm ORDER BY n DESC"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query the local contract index.")
+    parser.add_argument("--db", default=DEFAULT_INDEX_PATH, help="Index database path")
+    parser.add_argument("--text", help="Full-text query")
+    parser.add_argument("--field", help="Field label, e.g. 'Settlement Date'")
+    parser.add_argument("--start", help="Start date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="End date (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    index = CorpusIndex(args.db)
+    t0 = time.perf_counter()
+    if args.text:
+        results = index.search_text(args.text)
+    elif args.field:
+        results = index.find_by_field(args.field, args.start, args.end)
+    else:
+        parser.print_help()
+        raise SystemExit
+    elapsed = (time.perf_counter() - t0) * 1000
+    for r in results:
+        print(r)
+    print(f"{len(results)} results in {elapsed:.1f} ms")
@@ -1,73 +1,153 @@
-import fitz  # PyMuPDF
+import os
+import re
 import sys
+import shutil
 
-def highlight_evidence(pdf_path, output_path, text_to_find):
+from highlight_evidence_pure import FIRST_OCCURRENCE_ONLY, apply_fallback, page_content_hash
+
+def highlight_evidence(pdf_path, output_path, evidence, page_texts=None, page_hashes=None,
+                       text_free_pages=None, first_only=FIRST_OCCURRENCE_ONLY):
     """
-    Highlights exact matches of text_to_find in the PDF.
-    
+    Highlights every evidence quote in the PDF using PyMuPDF.
+
+    A faster drop-in for highlight_evidence_pure: each page's text is
+    extracted once and all quotes are searched against it, and the output is
+    written with a single incremental save.
+
     Args:
         pdf_path: Path to the source PDF.
         output_path: Path to save the highlighted PDF.
-        text_to_find: string to search for and highlight.
+        evidence: list of dicts [{"label": str, "quote": str, "gemini_page": int|None}],
+            or a single string to search for (labelled with itself).
+        page_texts: Optional list. If given, the raw text of each page is appended
+            to it in page order (used for corpus indexing).
+        page_hashes: Optional list. If given, the content hash of each page is
+            appended to it in page order (same hash as highlight_evidence_pure).
+        text_free_pages: Optional list. If given, the 1-based numbers of pages
+            with no text layer are appended to it.
+        first_only: If True, only the first occurrence of each label is
+            highlighted. Quotes contained in an already highlighted region
+            are not highlighted again.
+
+    Returns:
+        citation_map: {label: {"page": int, "status": "verified"|"unverified"|"missing"}}
     """
+    import fitz  # PyMuPDF
+
+    if isinstance(evidence, str):
+        evidence = [{"label": evidence, "quote": evidence, "gemini_page": None}]
+
+    # Helper to clean and normalize quotes (collapse whitespace for matching)
+    def clean(q):
+        if not q:
+            return None
+        return re.sub(r'\s+', ' ', q.strip().lower())
+
+    # Map quote_lower -> list of labels that use this quote
+    target_map = {}
+    for item in evidence:
+        q = clean(item.get("quote"))
+        if q:
+            target_map.setdefault(q, []).append(item["label"])
+    print(f"Searching for {sum(len(v) for v in target_map.values())} quotes "
+          f"({len(target_map)} unique strings)...")
+
+    if page_hashes is not None:
+        from pypdf import PdfReader
+        try:
+            memo = {}
+            page_hashes.extend(page_content_hash(page, memo) for page in PdfReader(pdf_path).pages)
+        except Exception as e:
+            print(f"Error hashing pages with pypdf: {e}")
+
+    # Incremental save only appends to the file it was opened from, so we
+    # annotate a copy of the input in place.
     try:
-        doc = fitz.open(pdf_path)
+        if os.path.abspath(pdf_path) != os.path.abspath(output_path):
+            shutil.copyfile(pdf_path, output_path)
+        doc = fitz.open(output_path)
     except Exception as e:
         print(f"Error opening PDF: {e}")
-        return
+        return {}
 
+    citation_map = {}
+    highlighted_labels = set()
     match_count = 0
-    
-    # Normalize text to find (optional, but good for robust search if needed, 
-    # though requirements say 'exact substring')
-    # text_to_find = text_to_find.strip()
-
-    print(f"Searching for: '{text_to_find}'...")
 
     for page_num, page in enumerate(doc):
-        # search_for returns a list of Rect objects
-        rects = page.search_for(text_to_find)
-        
-        for rect in rects:
+        # One text extraction per page, shared by every search below
+        textpage = page.get_textpage()
+        text = textpage.extractText()
+        if page_texts is not None:
+            page_texts.append(text)
+
+        normalized_text = re.sub(r'\s+', ' ', text).strip().lower()
+        if not normalized_text:
+            if text_free_pages is not None:
+                text_free_pages.append(page_num + 1)
+            continue
+
+        highlighted_rects = []
+        for target, labels in target_map.items():
+            # Cheap substring check first; search_for only for quotes on this page
+            count = normalized_text.count(target)
+            if not count:
+                continue
+            quads = page.search_for(target, quads=True, textpage=textpage)
+            if not quads:
+                continue
+
+            for lbl in labels:
+                if lbl not in citation_map:
+                    citation_map[lbl] = {"page": page_num + 1, "status": "verified"}
+
+            if first_only:
+                if all(lbl in highlighted_labels for lbl in labels):
+                    continue
+                # A hit spanning n lines yields n quads; keep the first hit's
+                quads = quads[:max(1, len(quads) // count)]
+            highlighted_labels.update(labels)
+
+            # Skip regions already covered by another quote's highlight
+            quads = [q for q in quads if not any(r.contains(q.rect) for r in highlighted_rects)]
+            if not quads:
+                continue
+            highlighted_rects.extend(q.rect for q in quads)
+
+            annot = page.add_highlight_annot(quads)
+            annot.update()
             match_count += 1
-            annot = page.add_highlight_annot(rect)
-            annot.update() # Ensure annotation is written
 
-    if match_count > 0:
-        print(f"Success: Found {match_count} instances")
-        try:
-            doc.save(output_path)
-            print(f"Saved highlighted PDF to: {output_path}")
-        except Exception as e:
-            print(f"Error saving PDF: {e}")
-    else:
-        print("ALERT: Text not found in document")
-        # Ensure we don't save a file if nothing changed? Or save anyway?
-        # Requirement says "Output: Save the modified file to output_path" 
-        # but if we didn't modify it, maybe we shouldn't overwrite?
-        # I'll save it anyway if user expects an output file regardless of finding highlights 
-        # (e.g. pipeline step), but usually if it's an ALERT, maybe no file is better.
-        # For now, I'll NOT save to avoid misleading valid outputs, unless requested.
-        # Actually, let's save a copy even if no highlights, so the pipeline continues?
-        # Re-reading: "If the text is not found: Print ALERT... Output: Save the modified file..."
-        # Implies saving even if no highlights (modified=0 edits).
-        doc.save(output_path)
+    apply_fallback(citation_map, evidence)
+    print(f"Added {match_count} highlights")
+
+    try:
+        if doc.can_save_incrementally():
+            doc.saveIncr()
+        else:
+            # e.g. repaired or encrypted input: fall back to a full rewrite
+            tmp_path = output_path + ".tmp"
+            doc.save(tmp_path, garbage=1, deflate=True)
+            doc.close()
+            os.replace(tmp_path, output_path)
+        print(f"Saved highlighted PDF to: {output_path}")
+    except Exception as e:
+        print(f"Error saving PDF: {e}")
+    finally:
+        if not doc.is_closed:
+            doc.close()
+
+    return citation_map
 
 if __name__ == "__main__":
-    # Test block
-    # Create a dummy PDF for testing if it doesn't exist? 
-    # Or just use placeholder paths.
-    
     # Example usage:
-    # python highlight_evidence.py input.pdf output.pdf "some text"
-    
+    # python highlight_evidence.py input.pdf output.pdf "some text" ["other text" ...]
+
     if len(sys.argv) > 3:
         i_path = sys.argv[1]
         o_path = sys.argv[2]
-        txt = sys.argv[3]
-        highlight_evidence(i_path, o_path, txt)
+        quotes = sys.argv[3:]
+        evidence = [{"label": q, "quote": q, "gemini_page": None} for q in quotes]
+        print(highlight_evidence(i_path, o_path, evidence))
     else:
-        # Default test run as requested
-        print("Running test mode with placeholder values (update code or pass args to run real test)...")
-        # Since I can't generate a PDF easily without reportlab, I'll just warn.
-        print("Usage: python highlight_evidence.py <input_pdf> <output_pdf> <text_to_find>")
+        print("Usage: python highlight_evidence.py <input_pdf> <output_pdf> <text_to_find> [...]")
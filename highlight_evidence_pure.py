@@ -1,19 +1,312 @@
+import os
+import re
 import sys
-from pypdf import PdfReader, PdfWriter
-from pypdf.generic import DictionaryObject, NameObject, ArrayObject, NumberObject
-from pdfminer.high_level import extract_pages
-from pdfminer.layout import LTChar, LTAnno
+import hashlib
 
-def highlight_evidence_pure(pdf_path, output_path, evidence):
+from profiling import profiled
+
+# Highlight only the first (navigation) occurrence of each label instead of
+# every occurrence. Smaller output on documents with repetitive boilerplate.
+FIRST_OCCURRENCE_ONLY = os.environ.get("LEGAL_VERIFIER_HIGHLIGHT_FIRST_ONLY", "0") == "1"
+
+# Write the output PDF compressed (object streams, deduplicated objects) and
+# linearized ("fast web view") so viewers can show page 1 before the whole
+# file has arrived. Linearization needs pikepdf; without it we only compress.
+OPTIMIZE_OUTPUT = os.environ.get("LEGAL_VERIFIER_OPTIMIZE_PDF", "1") != "0"
+
+# Text-showing operators: Tj, TJ, and ' / " after a string operand. A page
+# (and its form XObjects) without any cannot contain extractable text. We
+# don't look for "BT": generators often emit empty BT/ET blocks to set state.
+TEXT_SHOW_RE = re.compile(rb"(?<![A-Za-z0-9])T[jJ](?![A-Za-z0-9])|[)>]\s*['\"]")
+
+def page_content_hash(page, memo=None):
+    """
+    Returns a stable hash of a pypdf page's visible content.
+
+    Covers the page size, the content stream(s) and everything in /Resources,
+    recursively: form XObjects the page draws (tools like pdfpages put the
+    whole page text there), images, and fonts including their encoding and
+    ToUnicode streams. Two pages hash the same only if they render, and
+    extract, identically.
+
+    Args:
+        memo: Optional dict shared across the pages of one reader, so objects
+            used by many pages (fonts, shared forms) are hashed once.
+    """
+    memo = {} if memo is None else memo
+    h = hashlib.sha256()
+    try:
+        h.update(repr([float(v) for v in page.mediabox]).encode())
+        _hash_pdf_object(page.get("/Contents"), h, memo, set())
+        _hash_pdf_object(page.get("/Resources"), h, memo, set())
+    except Exception as e:
+        # Never fall back to a partial hash: a collision would serve another
+        # page's text from the cache. A unique value just means a cache miss.
+        print(f"Error hashing page: {e}")
+        h.update(os.urandom(16))
+    return h.hexdigest()
+
+def _hash_pdf_object(obj, h, memo, path):
+    """Feeds a pypdf object (and everything it references) into hash h."""
+    from pypdf.generic import IndirectObject, DictionaryObject, ArrayObject, StreamObject
+
+    if isinstance(obj, IndirectObject):
+        key = (obj.idnum, obj.generation)
+        if key in path:
+            h.update(b"<cycle>")
+            return
+        if key not in memo:
+            sub = hashlib.sha256()
+            _hash_pdf_object(obj.get_object(), sub, memo, path | {key})
+            memo[key] = sub.digest()
+        h.update(memo[key])
+    elif isinstance(obj, StreamObject):
+        h.update(b"<stream>")
+        _hash_pdf_object(DictionaryObject(
+            (k, v) for k, v in obj.items() if k not in ("/Length", "/Filter", "/DecodeParms")
+        ), h, memo, path)
+        h.update(hashlib.sha256(obj.get_data()).digest())
+    elif isinstance(obj, DictionaryObject):
+        h.update(b"<<")
+        for k in sorted(obj.keys()):
+            if k == "/Parent":  # back-reference up the page tree
+                continue
+            h.update(k.encode())
+            _hash_pdf_object(obj[k], h, memo, path)
+        h.update(b">>")
+    elif isinstance(obj, ArrayObject):
+        h.update(b"[")
+        for item in obj:
+            _hash_pdf_object(item, h, memo, path)
+        h.update(b"]")
+    else:
+        h.update(repr(obj).encode())
+
+def page_has_text(page, max_depth=3):
+    """
+    Cheap pre-check: True if the page's content stream (or a form XObject it
+    draws) shows any text. Image-only scans and blank separator pages
+    return False and can skip pdfminer layout analysis entirely.
+    """
+    try:
+        contents = page.get_contents()
+        if contents is not None and TEXT_SHOW_RE.search(contents.get_data()):
+            return True
+        return _xobjects_have_text(page.get("/Resources"), max_depth)
+    except Exception:
+        return True  # When in doubt, do the full layout pass
+
+def _xobjects_have_text(resources, depth):
+    if resources is None or depth <= 0:
+        return False
+    xobjects = resources.get_object().get("/XObject")
+    if xobjects is None:
+        return False
+    for ref in xobjects.get_object().values():
+        xobj = ref.get_object()
+        if xobj.get("/Subtype") != "/Form":
+            continue
+        if TEXT_SHOW_RE.search(xobj.get_data()):
+            return True
+        if _xobjects_have_text(xobj.get("/Resources"), depth - 1):
+            return True
+    return False
+
+def _line_quads(matched_bboxes):
+    """
+    Groups character bboxes into lines and returns the QuadPoints of one
+    (possibly multi-line) highlight: [x0, y1, x1, y1, x0, y0, x1, y0] per line.
+    """
+    # Group by line
+    matched_bboxes = sorted(matched_bboxes, key=lambda b: b[3], reverse=True)
+    
+    lines = []
+    if matched_bboxes:
+        current_line = [matched_bboxes[0]]
+        for b in matched_bboxes[1:]:
+            if abs(b[3] - current_line[0][3]) > 5:
+                lines.append(current_line)
+                current_line = [b]
+            else:
+                current_line.append(b)
+        lines.append(current_line)
+    
+    quads = []
+    for line_bboxes in lines:
+        x0 = min(b[0] for b in line_bboxes)
+        y0 = min(b[1] for b in line_bboxes)
+        x1 = max(b[2] for b in line_bboxes)
+        y1 = max(b[3] for b in line_bboxes)
+        quads.extend([x0, y1, x1, y1, x0, y0, x1, y0])
+    return quads
+
+def optimize_pdf(path):
+    """
+    Rewrites the PDF at path linearized, with object streams and compressed
+    streams. Returns True on success, False if pikepdf is unavailable or fails.
+    """
+    try:
+        import pikepdf
+    except ImportError:
+        print("pikepdf not installed: output is compressed but not linearized.")
+        return False
+
+    tmp_path = path + ".tmp"
+    try:
+        with pikepdf.open(path) as pdf:
+            pdf.save(
+                tmp_path,
+                linearize=True,
+                object_stream_mode=pikepdf.ObjectStreamMode.generate,
+                compress_streams=True,
+            )
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        print(f"Error linearizing PDF: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+def _empty_entry():
+    """Text index entry for a page without a text layer."""
+    return {"text": "", "norm_text": "", "bboxes": [], "matches": {}, "text_free": True}
+
+def _layout_to_entry(page_layout):
+    """
+    Builds the searchable text index of one pdfminer page layout.
+
+    Returns:
+        {"text": raw page text, "norm_text": normalized (lowercase, collapsed
+         whitespace) text, "bboxes": bbox (or None) per norm_text character,
+         "matches": {}}
+    """
+    from pdfminer.layout import LTChar, LTAnno
+
+    full_text = ""
+    char_map = [] # list of (char_bbox or None)
+
+    def extract_text_recursive(element):
+        nonlocal full_text
+        if isinstance(element, LTChar):
+            full_text += element.get_text()
+            char_map.append(element.bbox)
+        elif isinstance(element, LTAnno):
+            text = element.get_text()
+            if text == '\n':
+                full_text += ' '
+                char_map.append(None)
+            else:
+                full_text += text
+                char_map.append(None)
+        elif hasattr(element, '__iter__'):
+            for child in element:
+                extract_text_recursive(child)
+    
+    extract_text_recursive(page_layout)
+
+    # Normalize full_text for searching (collapse whitespace)
+    # But we need to map normalized indices back to original char_map
+    normalized_text = ""
+    norm_to_orig = []  # norm_to_orig[norm_idx] = orig_idx
+    
+    i = 0
+    while i < len(full_text):
+        c = full_text[i]
+        if c.isspace():
+            # Collapse consecutive whitespace to single space
+            if normalized_text and not normalized_text.endswith(' '):
+                normalized_text += ' '
+                norm_to_orig.append(i)
+            i += 1
+            while i < len(full_text) and full_text[i].isspace():
+                i += 1
+        else:
+            normalized_text += c.lower()
+            norm_to_orig.append(i)
+            i += 1
+
+    bboxes = []
+    for oi in norm_to_orig:
+        b = char_map[oi] if oi < len(char_map) else None
+        bboxes.append([round(v, 2) for v in b] if b is not None else None)
+
+    return {"text": full_text, "norm_text": normalized_text, "bboxes": bboxes, "matches": {}}
+
+def evidence_from_extraction(extracted_data):
+    """Builds the evidence list for highlight_evidence_pure from extract_legal_data output."""
+    evidence = []
+    for key, item in extracted_data.items():
+        if isinstance(item, dict):
+            evidence.append({
+                "label": key,
+                "quote": item.get('verbatim_quote'), 
+                "gemini_page": item.get('page_number')
+            })
+    return evidence
+
+def apply_fallback(citation_map, evidence):
+    """
+    Fills in labels that text search did not verify: Gemini's page number
+    (status "unverified") if it gave one, else status "missing".
+    """
+    for item in evidence:
+        lbl = item["label"]
+        if lbl not in citation_map:
+            # Not verified by text search
+            fallback_page = item.get("gemini_page")
+            
+            # Safety conversion
+            try:
+                if fallback_page:
+                    fallback_page = int(fallback_page)
+            except:
+                fallback_page = None
+                
+            if fallback_page:
+                citation_map[lbl] = {
+                    "page": fallback_page,
+                    "status": "unverified" # Warn user
+                }
+            else:
+                citation_map[lbl] = {
+                    "page": None,
+                    "status": "missing"
+                }
+    return citation_map
+
+@profiled(dir_arg="output_path")
+def highlight_evidence_pure(pdf_path, output_path, evidence, page_texts=None,
+                            page_cache=None, page_hashes=None, text_free_pages=None,
+                            first_only=FIRST_OCCURRENCE_ONLY, optimize=OPTIMIZE_OUTPUT):
     """
     Args:
         evidence: list of dicts [{"label": str, "quote": str, "gemini_page": int|None}]
+        page_texts: Optional list. If given, the raw text of each page is appended
+            to it in page order (used for corpus indexing).
+        page_cache: Optional page_cache.PageCache. Pages whose content hash is
+            cached reuse the stored layout index and quote matches; only new
+            or changed pages are parsed with pdfminer and searched.
+        page_hashes: Optional list. If given, the content hash of each page is
+            appended to it in page order (used for revision diffs).
+        text_free_pages: Optional list. If given, the 1-based numbers of pages
+            with no text layer (skipped; candidates for OCR) are appended to it.
+        first_only: If True, only the first occurrence of each label is
+            highlighted. Overlapping matches are always merged into one
+            annotation.
+        optimize: If True, the output is compressed and linearized (see
+            optimize_pdf) for fast first-page display.
         
     Returns:
         citation_map: {label: {"page": int, "status": "verified"|"unverified"}}
     """
+    # Imported here rather than at module level so that importing this module
+    # (e.g. during app start-up) stays cheap.
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.generic import DictionaryObject, NameObject, ArrayObject, NumberObject
+    from pdfminer.high_level import extract_pages
+
     # Helper to clean and normalize quotes (collapse whitespace for matching)
-    import re
     def clean(q):
         if not q:
             return None
@@ -35,168 +328,163 @@ def highlight_evidence_pure(pdf_path, output_path, evidence):
     targets_lower = list(target_map.keys())
     print(f"Searching for {valid_evidence_count} quotes ({len(targets_lower)} unique strings)...")
     
-    matches = {} # {page_index: [list of quad_points_lists]}
+    matches = {} # {page_index: [list of quad_points_lists]}, one list per annotation
     
     # Initialize results with labels
     # We will fill this in as we find them. 
     # If not found after scan, we fill with fallback.
     citation_map = {} 
     
+    # --- Page hashes & cache lookup ---
     try:
-        pages_generator = extract_pages(pdf_path)
+        reader = PdfReader(pdf_path)
+        memo = {}
+        hashes = [page_content_hash(page, memo) for page in reader.pages]
     except Exception as e:
-        print(f"Error reading PDF with pdfminer: {e}")
+        print(f"Error reading PDF with pypdf: {e}")
         return {}
-
-    match_count = 0
-    page_idx = 0
     
-    while True:
+    if page_hashes is not None:
+        page_hashes.extend(hashes)
+    
+    cached = page_cache.get_many(hashes) if page_cache is not None else {}
+    
+    # page_idx -> text index entry (see _layout_to_entry)
+    entries = {i: cached[h] for i, h in enumerate(hashes) if h in cached}
+    
+    # Pages without text operators can never match a quote: skip layout
+    to_parse = []
+    for i, h in enumerate(hashes):
+        if h in cached:
+            continue
+        if page_has_text(reader.pages[i]):
+            to_parse.append(i)
+        else:
+            entries[i] = _empty_entry()
+    
+    skipped = [i + 1 for i in sorted(entries) if entries[i].get("text_free")]
+    reused = sum(1 for h in hashes if h in cached)
+    print(f"Page cache: {reused} pages reused, {len(to_parse)} to parse, "
+          f"{len(skipped)} without text skipped {skipped}")
+    if text_free_pages is not None:
+        text_free_pages.extend(skipped)
+    
+    if to_parse:
         try:
-            page_layout = next(pages_generator)
-        except StopIteration:
-            break
+            pages_generator = extract_pages(pdf_path, page_numbers=to_parse)
         except Exception as e:
-            print(f"Error extracting content from page {page_idx}: {e}")
-            break
+            print(f"Error reading PDF with pdfminer: {e}")
+            return {}
 
-        full_text = ""
-        char_map = [] # list of (char_bbox or None)
-
-        def extract_text_recursive(element):
-            nonlocal full_text
-            if isinstance(element, LTChar):
-                full_text += element.get_text()
-                char_map.append(element.bbox)
-            elif isinstance(element, LTAnno):
-                text = element.get_text()
-                if text == '\n':
-                    full_text += ' '
-                    char_map.append(None)
-                else:
-                    full_text += text
-                    char_map.append(None)
-            elif hasattr(element, '__iter__'):
-                for child in element:
-                    extract_text_recursive(child)
-        
-        extract_text_recursive(page_layout)
+        # extract_pages yields the requested pages in ascending order
+        for page_idx in to_parse:
+            try:
+                page_layout = next(pages_generator)
+            except StopIteration:
+                break
+            except Exception as e:
+                print(f"Error extracting content from page {page_idx}: {e}")
+                break
+            entries[page_idx] = _layout_to_entry(page_layout)
 
-        # Normalize full_text for searching (collapse whitespace)
-        # But we need to map normalized indices back to original char_map
-        normalized_text = ""
-        norm_to_orig = []  # norm_to_orig[norm_idx] = orig_idx
+    match_count = 0
+    highlighted_labels = set()
+    updated_entries = {} # {page_hash: entry} to write back to the cache
+    
+    for page_idx in range(len(hashes)):
+        entry = entries.get(page_idx)
+        if entry is None:
+            # Page could not be extracted (pdfminer error above)
+            break
         
-        i = 0
-        while i < len(full_text):
-            c = full_text[i]
-            if c.isspace():
-                # Collapse consecutive whitespace to single space
-                if normalized_text and not normalized_text.endswith(' '):
-                    normalized_text += ' '
-                    norm_to_orig.append(i)
-                i += 1
-                while i < len(full_text) and full_text[i].isspace():
-                    i += 1
-            else:
-                normalized_text += c.lower()
-                norm_to_orig.append(i)
-                i += 1
+        if page_texts is not None:
+            page_texts.append(entry["text"])
+        
+        normalized_text = entry["norm_text"]
+        bboxes = entry["bboxes"]
+        page_matches = entry.setdefault("matches", {})
         
         page_quads = []
+        occurrences = [] # (start, end, target) in normalized text
         
         # Search for EACH unique target on this page
         for target in targets_lower:
-            start_idx = 0
-            while True:
-                idx = normalized_text.find(target, start_idx)
-                if idx == -1:
-                    break
-                
-                # Match found - map normalized indices back to original
-                orig_indices = [norm_to_orig[i] for i in range(idx, idx + len(target)) if i < len(norm_to_orig)]
-                raw_bboxes = [char_map[oi] for oi in orig_indices if oi < len(char_map)]
-                matched_bboxes = [b for b in raw_bboxes if b is not None]
-
-                if matched_bboxes:
-                     # Identify which labels verified by this quote
-                    labels = target_map[target]
-                    
-                    # For each label associated with this quote text
-                    for lbl in labels:
-                        if lbl not in citation_map:
-                            # Not yet found -> Mark Verified!
-                            citation_map[lbl] = {
-                                "page": page_idx + 1,
-                                "status": "verified"
-                            }
-                    
-                    # Logic: We might want to highlight ALL instances, 
-                    # but only record the first page for navigation?
-                    # Yes.
-                    
-                    # Group by line
-                    matched_bboxes.sort(key=lambda b: b[3], reverse=True)
-                    
-                    lines = []
-                    if matched_bboxes:
-                        current_line = [matched_bboxes[0]]
-                        for b in matched_bboxes[1:]:
-                            if abs(b[3] - current_line[0][3]) > 5:
-                                lines.append(current_line)
-                                current_line = [b]
-                            else:
-                                current_line.append(b)
-                        lines.append(current_line)
-                    
-                    instance_quads = []
-                    for line_bboxes in lines:
-                        x0 = min(b[0] for b in line_bboxes)
-                        y0 = min(b[1] for b in line_bboxes)
-                        x1 = max(b[2] for b in line_bboxes)
-                        y1 = max(b[3] for b in line_bboxes)
-                        instance_quads.extend([x0, y1, x1, y1, x0, y0, x1, y0])
-                    
-                    page_quads.append(instance_quads)
-                    match_count += 1
-                
-                start_idx = idx + 1 
+            if target in page_matches:
+                # Same page content searched for the same quote before
+                found_idxs = page_matches[target]
+            else:
+                found_idxs = []
+                start_idx = 0
+                while True:
+                    idx = normalized_text.find(target, start_idx)
+                    if idx == -1:
+                        break
+                    found_idxs.append(idx)
+                    start_idx = idx + 1
+                page_matches[target] = found_idxs
+                updated_entries[hashes[page_idx]] = entry
+            
+            for idx in found_idxs:
+                occurrences.append((idx, idx + len(target), target))
+        
+        # Walk occurrences in reading order so "first occurrence" is well defined
+        occurrences.sort()
+        intervals = []
+        for start, end, target in occurrences:
+            # Match found - normalized indices map directly to bboxes
+            if not any(b is not None for b in bboxes[start:end]):
+                continue
+            
+            # Identify which labels verified by this quote
+            labels = target_map[target]
+            
+            # For each label associated with this quote text
+            for lbl in labels:
+                if lbl not in citation_map:
+                    # Not yet found -> Mark Verified!
+                    citation_map[lbl] = {
+                        "page": page_idx + 1,
+                        "status": "verified"
+                    }
+            
+            # Navigation only needs the first occurrence of each label
+            if first_only and all(lbl in highlighted_labels for lbl in labels):
+                continue
+            highlighted_labels.update(labels)
+            intervals.append((start, end))
+            match_count += 1
+        
+        # Merge overlapping/adjacent matches (repeated quotes, quotes that are
+        # substrings of other quotes) so each region gets ONE annotation
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        
+        for start, end in merged:
+            matched_bboxes = [b for b in bboxes[start:end] if b is not None]
+            page_quads.append(_line_quads(matched_bboxes))
         
         if page_quads:
             matches[page_idx] = page_quads
         
-        page_idx += 1
+        if hashes[page_idx] not in cached:
+            updated_entries[hashes[page_idx]] = entry
+
+    if page_cache is not None:
+        try:
+            page_cache.put_many(updated_entries)
+        except Exception as e:
+            print(f"Error updating page cache: {e}")
 
     # --- Fallback Logic ---
-    # For any Evidence Label NOT in citation_map, checks fallback
-    for item in evidence:
-        lbl = item["label"]
-        if lbl not in citation_map:
-            # Not verified by text search
-            fallback_page = item.get("gemini_page")
-            
-            # Safety conversion
-            try:
-                if fallback_page:
-                    fallback_page = int(fallback_page)
-            except:
-                fallback_page = None
-                
-            if fallback_page:
-                citation_map[lbl] = {
-                    "page": fallback_page,
-                    "status": "unverified" # Warn user
-                }
-            else:
-                citation_map[lbl] = {
-                    "page": None,
-                    "status": "missing"
-                }
+    apply_fallback(citation_map, evidence)
 
     # Write highlights (Only for Verify matches)
     # We always write the PDF, even if no highlights, to keep consistent path
     try:
-        reader = PdfReader(pdf_path)
         writer = PdfWriter()
         
         for i, page in enumerate(reader.pages):
@@ -221,7 +509,15 @@ def highlight_evidence_pure(pdf_path, output_path, evidence):
                     
                     writer.add_annotation(page_number=i, annotation=annot)
 
+        if optimize:
+            for page in writer.pages:
+                page.compress_content_streams()
+            writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+
         writer.write(output_path)
+        
+        if optimize:
+            optimize_pdf(output_path)
         print(f"Saved highlighted PDF to: {output_path}")
 
     except Exception as e:
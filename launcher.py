@@ -8,12 +8,34 @@ import webbrowser
 import threading
 import multiprocessing
 
-def open_browser_delayed():
-    """Open browser after a delay to let server start"""
+SERVER_URL = "http://localhost:8501"
+HEALTH_URL = SERVER_URL + "/_stcore/health"
+
+def wait_for_server(timeout=60.0, interval=0.1):
+    """Poll Streamlit's health endpoint until it answers. Returns True if ready."""
     import time
-    time.sleep(4)
-    print("Opening browser...")
-    webbrowser.open("http://localhost:8501")
+    import urllib.request
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(HEALTH_URL, timeout=1) as resp:
+                if resp.status == 200:
+                    return True
+        except Exception:
+            pass
+        time.sleep(interval)
+    return False
+
+def open_browser_when_ready():
+    """Open browser as soon as the server reports healthy"""
+    import time
+    start = time.monotonic()
+    if wait_for_server():
+        print(f"Server ready after {time.monotonic() - start:.2f}s. Opening browser...")
+    else:
+        print("Server did not report ready in time. Opening browser anyway...")
+    webbrowser.open(SERVER_URL)
 
 def main():
     # CRITICAL: freeze_support must be called before anything else
@@ -50,7 +72,7 @@ def main():
     print("Starting Legal Doc Verifier...")
     
     # Open browser in background thread (only ONCE)
-    browser_thread = threading.Thread(target=open_browser_delayed, daemon=True)
+    browser_thread = threading.Thread(target=open_browser_when_ready, daemon=True)
     browser_thread.start()
     
     # Run Streamlit directly (not via subprocess)
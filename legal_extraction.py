@@ -1,11 +1,41 @@
 import os
+import re
 import time
+import shutil
 import argparse
 import json
-from google import genai
-from google.genai import types
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
-def extract_legal_data(pdf_path, model_name="gemini-3-flash-preview", api_key=None):
+from page_prefilter import build_reduced_pdf, extract_page_texts, reduced_page_list
+from local_extraction import extract_dates_locally, has_unexplained_dates, CORE_FIELDS
+from admission import cpu_slot, llm_slot
+from profiling import profiled, propagate
+
+# google.genai is imported inside the functions that use it: it pulls in a
+# large dependency tree and is only needed once the user clicks "Analyze".
+
+DEFAULT_MODEL = "gemini-3-flash-preview"
+
+# Bump whenever the prompt changes in a way that affects results, so stored
+# analyses (see result_store.py) from an older prompt are not reused.
+PROMPT_VERSION = "3"
+
+# Chunked mode (see extract_legal_data_chunked). Documents longer than
+# CHUNK_PAGES are split into overlapping page ranges extracted in parallel.
+CHUNK_PAGES = int(os.environ.get("LEGAL_VERIFIER_CHUNK_PAGES", "30"))
+CHUNK_OVERLAP = int(os.environ.get("LEGAL_VERIFIER_CHUNK_OVERLAP", "2"))
+CHUNK_WORKERS = int(os.environ.get("LEGAL_VERIFIER_CHUNK_WORKERS", "4"))
+
+# Send only pages that can contain dates (see page_prefilter.py).
+PREFILTER = os.environ.get("LEGAL_VERIFIER_PREFILTER", "1") != "0"
+
+# Try the rule-based extractor first (see local_extraction.py).
+LOCAL_FIRST = os.environ.get("LEGAL_VERIFIER_LOCAL_FIRST", "1") != "0"
+
+def extract_legal_data(pdf_path, model_name=DEFAULT_MODEL, api_key=None, prefilter=PREFILTER,
+                       known_fields=None, page_texts=None):
     """
     Uploads a PDF to Google Gemini and extracts legal data.
     
@@ -13,6 +43,12 @@ def extract_legal_data(pdf_path, model_name="gemini-3-flash-preview", api_key=No
         pdf_path: Path to the PDF file.
         model_name: Name of the Gemini model to use.
         api_key: Optional API key. If not provided, uses GEMINI_API_KEY env var.
+        prefilter: If True, only pages containing dates (plus context) are
+            uploaded; page_number values are mapped back to the original PDF.
+        known_fields: Optional {label: {"value", ...}} already resolved locally.
+            They are given to the model as hints to verify.
+        page_texts: Optional text layer of every page, if already extracted
+            (saves the prefilter a second pass over the document).
         
     Returns:
         JSON string containing the extracted data.
@@ -32,9 +68,41 @@ def extract_legal_data(pdf_path, model_name="gemini-3-flash-preview", api_key=No
     if not api_key:
         raise ValueError("No API key provided. Please enter your Gemini API key.")
 
+    # Local pre-pass: build a reduced PDF of just the candidate pages
+    page_map = None
+    upload_path = pdf_path
+    reduced_path = None
+    if prefilter:
+        fd, reduced_path = tempfile.mkstemp(prefix="legal_reduced_", suffix=".pdf")
+        os.close(fd)
+        try:
+            page_map = build_reduced_pdf(pdf_path, reduced_path, page_texts=page_texts)
+        except Exception as e:
+            print(f"Prefilter failed, sending full document: {e}")
+        if page_map:
+            upload_path = reduced_path
+
+    try:
+        # Process-wide cap on concurrent Gemini calls (see admission.py)
+        with llm_slot():
+            result = _generate_from_pdf(upload_path, model_name, api_key, known_fields)
+    finally:
+        if reduced_path:
+            os.remove(reduced_path)
+
+    if page_map:
+        data = parse_extraction_json(result)
+        remap_page_numbers(data, page_map)
+        result = json.dumps(data)
+    return result
+
+def _generate_from_pdf(pdf_path, model_name, api_key, known_fields=None):
+    """Uploads pdf_path, waits for processing and runs the extraction prompt."""
+    from google import genai
+    from google.genai import types
+
     client = genai.Client(api_key=api_key)
 
-    print(f"Uploading file: {pdf_path}...")
     print(f"Uploading file: {pdf_path}...")
     # Upload the file
     file_upload = client.files.upload(file=pdf_path)
@@ -69,6 +137,15 @@ def extract_legal_data(pdf_path, model_name="gemini-3-flash-preview", api_key=No
         3. "page_number": The integer page number where this information is found. **You must provide a page number estimate even if the value is null or handwritten.**
     """
 
+    if known_fields:
+        known = "\n".join(f"    - {label}: {item.get('value')}" for label, item in known_fields.items())
+        prompt += f"""
+    A rule-based parser suggested the values below. They may be wrong (e.g. conditional
+    clauses such as "whichever is later"). Check each against the document and include
+    it in your answer with the value the document actually supports:
+{known}
+    """
+
     response = client.models.generate_content(
         model=model_name,
         contents=[
@@ -89,12 +166,274 @@ def extract_legal_data(pdf_path, model_name="gemini-3-flash-preview", api_key=No
     )
 
     return response.text
+
+def parse_extraction_json(json_str):
+    """
+    Parses Gemini's response text into {label: {"value", "verbatim_quote", "page_number"}}.
+    
+    Strips ```json fences and merges list-wrapped objects ([{...}, {...}]).
+    
+    Raises:
+        ValueError: If the response is not valid JSON or not a dictionary.
+    """
+    cleaned_json = json_str.strip()
+    if cleaned_json.startswith("```json"):
+        cleaned_json = cleaned_json[7:]
+    if cleaned_json.endswith("```"):
+        cleaned_json = cleaned_json[:-3]
+    
+    try:
+        extracted_data = json.loads(cleaned_json)
+    except json.JSONDecodeError:
+        raise ValueError("Invalid JSON received.")
+    
+    # Handle list wrapping (e.g. [{...}])
+    if isinstance(extracted_data, list):
+        if len(extracted_data) > 0 and isinstance(extracted_data[0], dict):
+            # Usually it's just one object wrapped; merge if multiple.
+            temp_data = {}
+            for item in extracted_data:
+                if isinstance(item, dict):
+                    temp_data.update(item)
+            extracted_data = temp_data
+        else:
+            raise ValueError("Unexpected data format: List does not contain dictionaries.")
+    
+    if not isinstance(extracted_data, dict):
+        raise ValueError("Unexpected data format from AI. Expected dictionary.")
+    
+    return extracted_data
+
+def remap_page_numbers(data, page_map):
+    """
+    Rewrites page_number values (1-based, relative to a page subset) in place
+    to 1-based pages of the original document. Invalid pages become None.
+    
+    Args:
+        data: dict {label: {"page_number": int, ...}}
+        page_map: list where page_map[i] is the 0-based original index of subset page i
+    """
+    for item in data.values():
+        if not isinstance(item, dict):
+            continue
+        try:
+            page = int(item.get("page_number"))
+        except (TypeError, ValueError):
+            item["page_number"] = None
+            continue
+        item["page_number"] = page_map[page - 1] + 1 if 1 <= page <= len(page_map) else None
+    return data
+
+def write_page_subset(pdf_path, page_indices, output_path):
+    """Writes the given 0-based pages of pdf_path (in order) to output_path."""
+    from pypdf import PdfReader, PdfWriter
+    
+    reader = PdfReader(pdf_path)
+    writer = PdfWriter()
+    for i in page_indices:
+        writer.add_page(reader.pages[i])
+    writer.write(output_path)
+
+def chunk_page_ranges(total_pages, chunk_pages=CHUNK_PAGES, overlap=CHUNK_OVERLAP):
+    """
+    Splits [0, total_pages) into overlapping ranges.
+    
+    Returns:
+        list of (start, end) 0-based half-open ranges, e.g. 70 pages with
+        chunk_pages=30, overlap=2 -> [(0, 30), (28, 58), (56, 70)]
+    """
+    chunk_pages = max(1, chunk_pages)
+    overlap = max(0, min(overlap, chunk_pages - 1))
+    ranges = []
+    start = 0
+    while start < total_pages:
+        end = min(start + chunk_pages, total_pages)
+        ranges.append((start, end))
+        if end == total_pages:
+            break
+        start = end - overlap
+    return ranges
+
+def _normalize_value(value):
+    return re.sub(r'\s+', ' ', str(value).strip().lower()) if value is not None else None
+
+def merge_extractions(results):
+    """
+    Merges per-chunk extraction dicts (with absolute page numbers) by label.
+    
+    Labels are matched case/whitespace-insensitively. When chunks disagree:
+        1. Non-null values beat null ones.
+        2. The value reported by most chunks wins (overlap pages are seen twice).
+        3. Ties go to the candidate with a verbatim quote, then the earliest page.
+    
+    Returns:
+        dict {label: {"value", "verbatim_quote", "page_number"}}
+    """
+    candidates = {} # {norm_label: [(label, item), ...]}
+    for data in results:
+        for label, item in data.items():
+            if not isinstance(item, dict):
+                continue
+            key = re.sub(r'\s+', ' ', label.strip().lower())
+            candidates.setdefault(key, []).append((label, item))
+    
+    merged = {}
+    for key, entries in candidates.items():
+        label = entries[0][0]
+        items = [item for _, item in entries]
+        
+        with_value = [it for it in items if it.get("value") not in (None, "")]
+        pool = with_value or items
+        votes = Counter(_normalize_value(it.get("value")) for it in pool)
+        
+        def rank(it):
+            page = it.get("page_number")
+            return (
+                -votes[_normalize_value(it.get("value"))],
+                0 if it.get("verbatim_quote") else 1,
+                page if isinstance(page, int) else float("inf"),
+            )
+        
+        best = min(pool, key=rank)
+        if len(votes) > 1:
+            print(f"Conflict for '{label}': {sorted(v for v in votes if v)} -> {best.get('value')}")
+        merged[label] = best
+    return merged
+
+@profiled()
+def extract_legal_data_chunked(pdf_path, model_name=DEFAULT_MODEL, api_key=None,
+                               chunk_pages=CHUNK_PAGES, overlap=CHUNK_OVERLAP,
+                               max_workers=CHUNK_WORKERS, prefilter=PREFILTER, known_fields=None,
+                               page_texts=None):
+    """
+    Like extract_legal_data, but splits long PDFs into overlapping page ranges
+    that are extracted concurrently, then merged (see merge_extractions).
+    
+    The prefilter runs once on the whole document first; only the candidate
+    pages are chunked, so a long bundle with few dated pages is still sent
+    in a single request. At most chunk_pages pages are sent per request.
+    
+    Args:
+        page_texts: Optional text layer of every page, if already extracted.
+    
+    Returns:
+        JSON string containing the extracted data, with page_number values
+        relative to the original document.
+    """
+    pages = None
+    if prefilter:
+        try:
+            with cpu_slot():
+                if page_texts is None:
+                    page_texts = extract_page_texts(pdf_path)
+                pages = reduced_page_list(page_texts)
+            total_pages = len(page_texts)
+        except Exception as e:
+            print(f"Prefilter failed, sending full document: {e}")
+    if pages is None:
+        from pypdf import PdfReader
+        total_pages = len(PdfReader(pdf_path).pages)
+        if total_pages <= chunk_pages:
+            return extract_legal_data(
+                pdf_path, model_name=model_name, api_key=api_key,
+                prefilter=False, known_fields=known_fields
+            )
+        pages = list(range(total_pages))
+    else:
+        print(f"Prefilter: sending {len(pages)} of {total_pages} pages")
+    
+    ranges = chunk_page_ranges(len(pages), chunk_pages, overlap)
+    if len(ranges) > 1:
+        print(f"Chunked extraction: {len(pages)} pages in {len(ranges)} chunks ({max_workers} workers)")
+    
+    work_dir = tempfile.mkdtemp(prefix="legal_chunks_")
+    try:
+        def run_chunk(chunk):
+            start, end = chunk
+            chunk_map = pages[start:end]
+            chunk_path = os.path.join(work_dir, f"chunk_{start + 1}_{end}.pdf")
+            write_page_subset(pdf_path, chunk_map, chunk_path)
+            data = parse_extraction_json(
+                extract_legal_data(
+                    chunk_path, model_name=model_name, api_key=api_key,
+                    prefilter=False, known_fields=known_fields
+                )
+            )
+            # Remap chunk-relative page numbers to original pages
+            return remap_page_numbers(data, chunk_map)
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            # Chunk workers are sampled by this run's profile, if any
+            results = list(pool.map(propagate(run_chunk), ranges))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    return json.dumps(merge_extractions(results))
+
+@profiled()
+def extract_legal_data_hybrid(pdf_path, model_name=DEFAULT_MODEL, api_key=None,
+                              local_first=LOCAL_FIRST, **chunk_kwargs):
+    """
+    Runs the rule-based extractor first and calls Gemini only for what it
+    could not resolve confidently.
+    
+    Gemini is skipped entirely only when the core fields (CORE_FIELDS) are
+    resolved, every date label seen in the document was resolved, and no
+    other date or date reference remains outside the resolved quotes (see
+    local_extraction.has_unexplained_dates).
+    Otherwise Gemini runs (chunked, see extract_legal_data_chunked) with the
+    locally resolved fields as hints to verify. Where both give a value and
+    they disagree, Gemini's value is kept and the conflict is reported;
+    local values fill in fields Gemini left empty.
+    
+    Returns:
+        JSON string containing the extracted data.
+    """
+    if not local_first:
+        return extract_legal_data_chunked(pdf_path, model_name=model_name, api_key=api_key, **chunk_kwargs)
+    
+    page_texts = None
+    try:
+        # pdfminer pass + regex scan: CPU-bound like highlighting
+        with cpu_slot():
+            page_texts = extract_page_texts(pdf_path)
+            resolved, unresolved = extract_dates_locally(page_texts)
+    except Exception as e:
+        print(f"Local extraction failed, using Gemini only: {e}")
+        resolved, unresolved = {}, []
+    print(f"Local extraction: {len(resolved)} resolved, unresolved: {unresolved}")
+    
+    if (not unresolved and all(field in resolved for field in CORE_FIELDS)
+            and not has_unexplained_dates(page_texts, resolved)):
+        print("All fields resolved locally. Skipping Gemini.")
+        return json.dumps(resolved)
+    
+    llm_data = parse_extraction_json(extract_legal_data_chunked(
+        pdf_path, model_name=model_name, api_key=api_key,
+        known_fields=resolved, page_texts=page_texts, **chunk_kwargs
+    ))
+    llm_by_key = {
+        re.sub(r'\s+', ' ', label.strip().lower()): label
+        for label, item in llm_data.items() if isinstance(item, dict)
+    }
+    merged = dict(llm_data)
+    for label, local_item in resolved.items():
+        llm_label = llm_by_key.get(re.sub(r'\s+', ' ', label.strip().lower()))
+        llm_value = llm_data[llm_label].get("value") if llm_label else None
+        if llm_value in (None, ""):
+            # Gemini has nothing for this field: use the local value
+            merged.pop(llm_label, None)
+            merged[label] = local_item
+        elif _normalize_value(llm_value) != _normalize_value(local_item["value"]):
+            print(f"Conflict for '{label}': local {local_item['value']} vs Gemini {llm_value} -> Gemini")
+    return json.dumps(merged)
     
 def list_models():
     api_key = os.environ.get("GEMINI_API_KEY")
     if not api_key:
         raise ValueError("GEMINI_API_KEY environment variable not set.")
     
+    from google import genai
     client = genai.Client(api_key=api_key)
     print("Listing available models...")
     for model in client.models.list():
@@ -103,8 +442,13 @@ def list_models():
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Extract legal data from a PDF using Google Gemini.")
     parser.add_argument("pdf_path", nargs="?", help="Path to the PDF file")
-    parser.add_argument("--model", default="gemini-3-flash-preview", help="Gemini model to use (default: gemini-3-flash-preview)")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"Gemini model to use (default: {DEFAULT_MODEL})")
     parser.add_argument("--refresh-models", action="store_true", help="List available models")
+    parser.add_argument("--chunk-pages", type=int, default=CHUNK_PAGES, help=f"Pages per chunk for long documents (default: {CHUNK_PAGES})")
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP, help=f"Pages shared by adjacent chunks (default: {CHUNK_OVERLAP})")
+    parser.add_argument("--workers", type=int, default=CHUNK_WORKERS, help=f"Chunks extracted concurrently (default: {CHUNK_WORKERS})")
+    parser.add_argument("--no-prefilter", action="store_true", help="Upload all pages instead of only pages containing dates")
+    parser.add_argument("--no-local", action="store_true", help="Skip the rule-based extractor and always ask Gemini")
 
     args = parser.parse_args()
 
@@ -114,7 +458,11 @@ if __name__ == "__main__":
         if not os.path.exists(args.pdf_path):
             print(f"Error: File not found at {args.pdf_path}")
         else:
-            result = extract_legal_data(args.pdf_path, args.model)
+            result = extract_legal_data_hybrid(
+                args.pdf_path, args.model,
+                chunk_pages=args.chunk_pages, overlap=args.overlap, max_workers=args.workers,
+                prefilter=not args.no_prefilter, local_first=not args.no_local
+            )
             if result:
                 print("\nMetadata Verification:")
                 # Pretty print the JSON to verify it parses
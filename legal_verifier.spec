@@ -5,15 +5,17 @@ Run with: pyinstaller legal_verifier.spec
 """
 
 import sys
-from PyInstaller.utils.hooks import collect_all, collect_data_files
+from PyInstaller.utils.hooks import collect_all, collect_data_files, collect_submodules
 
 # Collect all streamlit data files
 datas = []
 binaries = []
 hiddenimports = []
 
-# Streamlit requires many hidden imports and data files
-for pkg in ['streamlit', 'altair', 'pydeck', 'pypdf', 'pdfminer', 'google.genai', 'google.generativeai']:
+# Streamlit needs its static frontend assets, so it is the only package we
+# collect wholesale. altair/pydeck are not used by the app and are left to
+# normal import analysis instead of being force-collected.
+for pkg in ['streamlit']:
     try:
         pkg_datas, pkg_binaries, pkg_hiddenimports = collect_all(pkg)
         datas.extend(pkg_datas)
@@ -22,17 +24,34 @@ for pkg in ['streamlit', 'altair', 'pydeck', 'pypdf', 'pdfminer', 'google.genai'
     except Exception as e:
         print(f"Warning: Could not collect {pkg}: {e}")
 
+# app.py is run by Streamlit at runtime and is not analysed by PyInstaller,
+# so its (lazily imported) dependencies must be listed explicitly. Only code
+# is collected here; pdfminer additionally needs its CMap data files.
+for pkg in ['pypdf', 'pdfminer', 'google.genai', 'pikepdf']:
+    try:
+        hiddenimports.extend(collect_submodules(pkg))
+    except Exception as e:
+        print(f"Warning: Could not collect {pkg}: {e}")
+datas.extend(collect_data_files('pdfminer'))
+
 # Add our app files
 datas.extend([
     ('app.py', '.'),
     ('legal_extraction.py', '.'),
     ('highlight_evidence_pure.py', '.'),
+    ('highlight_evidence.py', '.'),
+    ('corpus_index.py', '.'),
+    ('result_store.py', '.'),
+    ('page_cache.py', '.'),
+    ('page_prefilter.py', '.'),
+    ('local_extraction.py', '.'),
+    ('admission.py', '.'),
+    ('profiling.py', '.'),
+    ('sqlite_util.py', '.'),
 ])
 
-# Additional hidden imports for google genai
 hiddenimports.extend([
-    'google.generativeai',
-    'google.ai.generativelanguage',
+    'fitz',
     'PIL',
     'PIL.Image',
 ])
@@ -46,25 +65,31 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=[
+        'tkinter',
+        'matplotlib',
+        'IPython',
+        'notebook',
+        'pytest',
+        'google.generativeai',
+    ],
     noarchive=False,
 )
 
 pyz = PYZ(a.pure)
 
+# onedir build: binaries and data live next to the EXE instead of being
+# unpacked to a temp directory on every launch.
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,      # Include binaries in EXE for onefile
-    a.datas,         # Include datas in EXE for onefile
     [],
+    exclude_binaries=True,
     name='LegalDocVerifier',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=True,  # Set to False to hide console window
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -72,3 +97,13 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='LegalDocVerifier',
+)
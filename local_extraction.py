@@ -0,0 +1,358 @@
+"""
+Deterministic, rule-based date extractor.
+
+A zero-latency fast path in front of Gemini for standard-form contracts:
+
+    1. Find known field labels ("Contract Date", "Settlement Date", ...) in
+       the page text and the date written after them.
+    2. Resolve relative dates ("42 days after the Contract Date",
+       "5 business days after the Finance Date") with calendar or
+       business-day arithmetic, using a configurable holiday calendar.
+    3. Report every field it resolved unambiguously, in the same
+       {value, verbatim_quote, page_number} shape as extract_legal_data,
+       plus the labels it saw but could not resolve (left to the LLM).
+"""
+import os
+import re
+from datetime import date, timedelta
+
+from page_prefilter import MONTHS
+
+# Canonical field label -> regex alternatives used in contracts
+FIELD_ALIASES = {
+    "Contract Date": [
+        r"contract date", r"date of (?:this )?(?:contract|agreement)", r"agreement date",
+    ],
+    "Settlement Date": [
+        r"settlement date", r"completion date", r"date (?:for|of) (?:settlement|completion)",
+    ],
+    "Finance Date": [
+        r"finance date", r"finance approval date", r"date for finance approval",
+    ],
+    "Deposit Due Date": [
+        r"deposit due date", r"(?:balance )?deposit (?:is )?due",
+    ],
+    "Building and Pest Inspection Date": [
+        r"building and pest (?:inspection )?date", r"inspection date",
+    ],
+    "Cooling-off Period End": [
+        r"cooling[- ]off (?:period )?(?:ends?|expiry|end date)",
+    ],
+}
+
+# Fields that must be resolved locally before the LLM can be skipped entirely
+CORE_FIELDS = ["Contract Date", "Settlement Date"]
+
+# Public holidays (ISO dates, comma separated) excluded from business days
+HOLIDAYS = {
+    date.fromisoformat(d.strip())
+    for d in os.environ.get("LEGAL_VERIFIER_HOLIDAYS", "").split(",") if d.strip()
+}
+
+MONTH_NUMBERS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+LABEL_RE = re.compile(
+    "|".join(f"(?P<f{i}>{'|'.join(aliases)})" for i, aliases in enumerate(FIELD_ALIASES.values())),
+    re.IGNORECASE,
+)
+LABEL_NAMES = list(FIELD_ALIASES.keys())
+
+DATE_RES = [
+    # 12/03/2024, 12-03-2024, 12.03.24 (day first)
+    ("dmy", re.compile(r"\b(\d{1,2})\s*[/.-]\s*(\d{1,2})\s*[/.-]\s*(\d{4}|\d{2})\b")),
+    # 2024-03-12
+    ("ymd", re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")),
+    # 12 March 2024, 12th day of March, 2024
+    ("d_mon_y", re.compile(
+        r"\b(\d{1,2})(?:st|nd|rd|th)?\s+(?:day\s+of\s+)?(" + MONTHS + r")\.?,?\s+(\d{4})\b", re.IGNORECASE)),
+    # March 12, 2024
+    ("mon_d_y", re.compile(
+        r"\b(" + MONTHS + r")\.?\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})\b", re.IGNORECASE)),
+]
+
+RELATIVE_RE = re.compile(
+    r"(?:[a-z-]+\s*\((?P<n_paren>\d+)\)|(?P<n>\d+))\s+"
+    r"(?P<kind>business\s+|working\s+|clear\s+|calendar\s+)?days?\s+"
+    r"(?P<dir>after|from|following|before|prior\s+to)\s+(?:the\s+)?"
+    r"(?P<ref>" + LABEL_RE.pattern + r")",
+    re.IGNORECASE,
+)
+
+# Any "<n> days/weeks/months after/of <... date>" expression, including
+# units and anchors RELATIVE_RE cannot compute (used to spot extra values)
+ANY_RELATIVE_RE = re.compile(
+    r"(?:\d+|\(\d+\))\s+(?:business\s+|working\s+|clear\s+|calendar\s+)?"
+    r"(?:days?|weeks?|months?)\s+(?:after|before|from|of|following|prior\s+to)\s+"
+    r"(?:the\s+)?(?:[a-z-]+\s+){0,3}date\b",
+    re.IGNORECASE,
+)
+
+# Wording that makes a date conditional on something else
+CONDITIONAL_RE = re.compile(
+    r"\bwhichever\b|\b(?:later|earlier|latter|former)\s+of\b|\bsubject\s+to\b|"
+    r"\bunless\b|\bor\s+such\s+(?:other|later|earlier)\b",
+    re.IGNORECASE,
+)
+
+# A label preceded by these words is a reference ("42 days after the Contract Date")
+REFERENCE_PREFIX_RE = re.compile(r"(?:after|from|following|before|prior\s+to|of)\s+(?:the\s+)?$", re.IGNORECASE)
+
+# How far after a label we look for its date (characters)
+VALUE_WINDOW = 80
+# How far a label's clause may run (characters), and where it ends
+CLAUSE_WINDOW = 200
+CLAUSE_END_RE = re.compile(r"[.;]\s")
+
+def format_date(d):
+    return d.strftime("%d-%m-%Y")
+
+def add_days(start, n, business=False, holidays=None):
+    """
+    Adds n (possibly negative) days to start. With business=True, weekends
+    and holidays are skipped.
+    """
+    if not business:
+        return start + timedelta(days=n)
+    holidays = HOLIDAYS if holidays is None else holidays
+    step = 1 if n >= 0 else -1
+    remaining = abs(n)
+    current = start
+    while remaining:
+        current += timedelta(days=step)
+        if current.weekday() < 5 and current not in holidays:
+            remaining -= 1
+    return current
+
+def _to_date(kind, groups):
+    try:
+        if kind == "dmy":
+            d, m, y = (int(g) for g in groups)
+            y = y + 2000 if y < 100 else y
+        elif kind == "ymd":
+            y, m, d = (int(g) for g in groups)
+        elif kind == "d_mon_y":
+            d, m, y = int(groups[0]), MONTH_NUMBERS[groups[1][:3].lower()], int(groups[2])
+        else:
+            m, d, y = MONTH_NUMBERS[groups[0][:3].lower()], int(groups[1]), int(groups[2])
+        return date(y, m, d)
+    except (ValueError, KeyError):
+        return None
+
+def find_dates(text):
+    """Returns [(start, end, date)] for absolute dates in text, in order."""
+    found = []
+    for kind, regex in DATE_RES:
+        for m in regex.finditer(text):
+            d = _to_date(kind, m.groups())
+            if d and not any(s < m.end() and m.start() < e for s, e, _ in found):
+                found.append((m.start(), m.end(), d))
+    return sorted(found, key=lambda f: f[0])
+
+def _label_of(match):
+    """Canonical field name of a LABEL_RE / RELATIVE_RE match."""
+    for i, name in enumerate(LABEL_NAMES):
+        if match.group(f"f{i}"):
+            return name
+    return None
+
+def _clause(rest):
+    """
+    The text belonging to a label: up to the next label that is not a
+    reference, the end of the sentence, or CLAUSE_WINDOW characters.
+    """
+    end = len(rest)
+    for m in LABEL_RE.finditer(rest):
+        if not REFERENCE_PREFIX_RE.search(rest[:m.start()]):
+            end = m.start()
+            break
+    sentence_end = CLAUSE_END_RE.search(rest, 0, end)
+    if sentence_end:
+        end = sentence_end.start()
+    return rest[:min(end, CLAUSE_WINDOW)]
+
+def _find_candidates(page_texts):
+    """
+    Scans pages for "<label> ... <date | relative expression>".
+
+    Returns:
+        (candidates, seen):
+            candidates: {field: [{"kind": "absolute"|"relative"|"conditional",
+                "date"|("n", "business", "ref"), "quote": str, "page": int}]}
+                "conditional" marks a clause with several values or a
+                condition ("..., whichever is later"), never resolved locally.
+            seen: every field whose label appears as a definition, including
+                those with no value we can parse.
+    """
+    candidates = {}
+    seen = set()
+    for page_idx, page_text in enumerate(page_texts):
+        lines = [re.sub(r"\s+", " ", l).strip() for l in page_text.splitlines()]
+        for line_idx, line in enumerate(lines):
+            for label_match in LABEL_RE.finditer(line):
+                field = _label_of(label_match)
+                # "... days after the Contract Date" -> label is a reference, not a definition
+                if REFERENCE_PREFIX_RE.search(line[:label_match.start()]):
+                    continue
+                seen.add(field)
+
+                # Value usually follows on the same line; also allow the next
+                # line for "Settlement Date:\n 30/05/2024" table layouts.
+                rest = line[label_match.end():]
+                if not rest.strip(" :.-") and line_idx + 1 < len(lines):
+                    rest = rest + " " + lines[line_idx + 1]
+                # Stop at the next label so we don't steal its value
+                clause = _clause(rest)
+                values = len(find_dates(clause)) + len(ANY_RELATIVE_RE.findall(clause))
+                if values and (values > 1 or CONDITIONAL_RE.search(clause)):
+                    # "42 days after the Contract Date or 15/06/2024, whichever
+                    # is later": not something a rule can resolve confidently
+                    candidates.setdefault(field, []).append({
+                        "kind": "conditional",
+                        "quote": (label_match.group(0) + clause).strip(),
+                        "page": page_idx + 1,
+                    })
+                    continue
+
+                window = clause[:VALUE_WINDOW]
+                rel = RELATIVE_RE.search(window)
+                dates = find_dates(window)
+                first_date = dates[0] if dates else None
+
+                if rel and (not first_date or rel.start() < first_date[0]):
+                    n = int(rel.group("n_paren") or rel.group("n"))
+                    if rel.group("dir").lower().startswith(("before", "prior")):
+                        n = -n
+                    kind = (rel.group("kind") or "").strip().lower()
+                    end = rel.end()
+                    candidate = {
+                        "kind": "relative",
+                        "n": n,
+                        "business": kind in ("business", "working"),
+                        "ref": _label_of(rel),
+                    }
+                elif first_date:
+                    end = first_date[1]
+                    candidate = {"kind": "absolute", "date": first_date[2]}
+                else:
+                    continue
+
+                quote = (label_match.group(0) + rest[:end]).strip()
+                candidate.update({"quote": quote, "page": page_idx + 1})
+                candidates.setdefault(field, []).append(candidate)
+    return candidates, seen
+
+def extract_dates_locally(page_texts, holidays=None):
+    """
+    Rule-based extraction of standard contract dates.
+
+    Args:
+        page_texts: list of page text strings, in page order.
+        holidays: Optional set of datetime.date excluded from business days
+            (defaults to LEGAL_VERIFIER_HOLIDAYS).
+
+    Returns:
+        (resolved, unresolved):
+            resolved: {label: {"value": "DD-MM-YYYY", "verbatim_quote": str, "page_number": int}}
+                for fields found with exactly one consistent value.
+            unresolved: list of labels seen in the document whose value is
+                missing, unparsable, conflicting or depends on an unresolved field.
+    """
+    candidates, seen = _find_candidates(page_texts)
+    resolved = {}
+    pending = {}
+    cross_checks = {} # field -> relative candidate that must agree with its absolute date
+    derived_from = {} # field -> field its relative date was computed from
+
+    for field, cands in candidates.items():
+        if any(c["kind"] == "conditional" for c in cands):
+            continue  # left to the LLM
+        absolute = [c for c in cands if c["kind"] == "absolute"]
+        relative = [c for c in cands if c["kind"] == "relative"]
+        specs = {(c["n"], c["business"], c["ref"]) for c in relative}
+        if absolute:
+            values = {c["date"] for c in absolute}
+            if len(values) == 1 and len(specs) <= 1:
+                first = absolute[0]
+                resolved[field] = {
+                    "value": format_date(first["date"]),
+                    "verbatim_quote": first["quote"],
+                    "page_number": first["page"],
+                }
+                if relative:
+                    cross_checks[field] = relative[0]
+            continue  # conflicting dates stay unresolved
+        if len(specs) == 1:
+            pending[field] = relative[0]
+
+    # Resolve relative dates; repeat so chains (A -> B -> C) work
+    progress = True
+    while pending and progress:
+        progress = False
+        for field, cand in list(pending.items()):
+            base = resolved.get(cand["ref"])
+            if cand["ref"] == field or not base:
+                continue
+            day, month, year = (int(p) for p in base["value"].split("-"))
+            value = add_days(date(year, month, day), cand["n"], cand["business"], holidays)
+            resolved[field] = {
+                "value": format_date(value),
+                "verbatim_quote": cand["quote"],
+                "page_number": cand["page"],
+            }
+            derived_from[field] = cand["ref"]
+            del pending[field]
+            progress = True
+
+    # A field stated both ways ("Completion Date 01-05-2024" and "Settlement
+    # Date: 42 days after the Contract Date") must agree, else leave it to the LLM
+    for field, cand in cross_checks.items():
+        base = resolved.get(cand["ref"])
+        if not base or cand["ref"] == field:
+            continue
+        day, month, year = (int(p) for p in base["value"].split("-"))
+        value = add_days(date(year, month, day), cand["n"], cand["business"], holidays)
+        if format_date(value) != resolved[field]["value"]:
+            del resolved[field]
+
+    # Drop anything computed from a field that turned out to be unreliable
+    dropped = True
+    while dropped:
+        dropped = False
+        for field, ref in list(derived_from.items()):
+            if field in resolved and ref not in resolved:
+                del resolved[field]
+                dropped = True
+
+    unresolved = [field for field in LABEL_NAMES if field in seen and field not in resolved]
+    return resolved, unresolved
+
+def has_unexplained_dates(page_texts, resolved):
+    """
+    True if any page holds an absolute date or a relative date expression
+    ("7 days after the Sunset Date") outside the quotes of the resolved
+    fields, i.e. the document may hold dates this extractor does not know.
+    Plain mentions of a label ("on the Settlement Date") don't count.
+    """
+    quotes = [item["verbatim_quote"] for item in resolved.values() if item.get("verbatim_quote")]
+    for text in page_texts:
+        remaining = re.sub(r"\s+", " ", text)
+        for quote in quotes:
+            remaining = remaining.replace(quote, " ")
+        if find_dates(remaining) or ANY_RELATIVE_RE.search(remaining):
+            return True
+    return False
+
+if __name__ == "__main__":
+    import sys
+    import json
+    from page_prefilter import extract_page_texts
+
+    if len(sys.argv) < 2:
+        print("Usage: python local_extraction.py <input_pdf>")
+    else:
+        resolved, unresolved = extract_dates_locally(extract_page_texts(sys.argv[1]))
+        print(json.dumps(resolved, indent=2))
+        print(f"Unresolved: {unresolved}")
@@ -0,0 +1,139 @@
+"""
+Page-level cache for incremental re-analysis of revised contracts.
+
+Every page is identified by a hash of its content and resources (see
+highlight_evidence_pure.page_content_hash). For each page hash we keep the
+text/layout index built by pdfminer (normalized text plus one bbox per
+character) and the quote matches already found on it. When a new revision
+of a contract is uploaded, unchanged pages are served from here and only
+changed pages are re-parsed and re-searched.
+"""
+import json
+import os
+import time
+
+from sqlite_util import connect
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".legal_verifier_pages.db")
+
+# Least recently used pages beyond this many are evicted
+MAX_PAGES = int(os.environ.get("LEGAL_VERIFIER_PAGE_CACHE_MAX_PAGES", "5000"))
+# Quote matches kept per page (oldest dropped first)
+MAX_MATCHES_PER_PAGE = int(os.environ.get("LEGAL_VERIFIER_PAGE_CACHE_MAX_MATCHES", "200"))
+
+class PageCache:
+    """
+    SQLite-backed cache of per-page layout indexes.
+
+    Entries are dicts:
+        {"text": str, "norm_text": str, "bboxes": [[x0, y0, x1, y1] | None, ...],
+         "matches": {target: [start_idx, ...]}}
+    where bboxes[i] is the bbox of norm_text[i].
+
+    The cache is bounded: lookups refresh a page's updated_at, and after each
+    write only the max_pages most recently used pages are kept.
+    """
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, max_pages=MAX_PAGES,
+                 max_matches=MAX_MATCHES_PER_PAGE):
+        self.db_path = db_path
+        self.max_pages = max_pages
+        self.max_matches = max_matches
+        self._init_schema()
+
+    def _init_schema(self):
+        with connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    page_hash TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS pages_updated_at ON pages (updated_at)")
+
+    def get_many(self, page_hashes):
+        """Returns {page_hash: entry} for the hashes that are cached."""
+        unique = list(set(page_hashes))
+        found = {}
+        with connect(self.db_path) as conn:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                placeholders = ",".join("?" for _ in batch)
+                for page_hash, data in conn.execute(
+                    f"SELECT page_hash, data FROM pages WHERE page_hash IN ({placeholders})", batch
+                ):
+                    found[page_hash] = json.loads(data)
+            if found:
+                # Mark as recently used so eviction keeps them
+                conn.executemany(
+                    "UPDATE pages SET updated_at = ? WHERE page_hash = ?",
+                    [(time.time(), h) for h in found]
+                )
+        return found
+
+    def put_many(self, entries):
+        """Stores {page_hash: entry}, replacing existing entries, then evicts
+        the least recently used pages beyond max_pages."""
+        if not entries:
+            return
+        now = time.time()
+        rows = []
+        for h, entry in entries.items():
+            matches = entry.get("matches") or {}
+            if len(matches) > self.max_matches:
+                # Dicts keep insertion order: drop the quotes searched first
+                entry = dict(entry, matches=dict(list(matches.items())[-self.max_matches:]))
+            rows.append((h, json.dumps(entry), now))
+        with connect(self.db_path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO pages (page_hash, data, updated_at) VALUES (?, ?, ?)", rows
+            )
+            conn.execute(
+                "DELETE FROM pages WHERE page_hash NOT IN "
+                "(SELECT page_hash FROM pages ORDER BY updated_at DESC LIMIT ?)",
+                (self.max_pages,)
+            )
+
+def diff_versions(old_hashes, new_hashes, old_citation_map):
+    """
+    Compares two revisions of a document by page hash.
+
+    Args:
+        old_hashes: list of page hashes of the previous revision (page order).
+        new_hashes: list of page hashes of the new revision.
+        old_citation_map: {label: {"page": int|None, ...}} of the previous revision.
+
+    Returns:
+        {"changed_pages": [int],   # 1-based pages of the new revision not in the old one
+         "removed_pages": [int],   # 1-based pages of the old revision not in the new one
+         "affected_fields": [str]} # labels whose cited page changed (or had no page)
+    """
+    old_set = set(old_hashes)
+    new_set = set(new_hashes)
+
+    changed_pages = [i + 1 for i, h in enumerate(new_hashes) if h not in old_set]
+    removed_pages = [i + 1 for i, h in enumerate(old_hashes) if h not in new_set]
+
+    affected_fields = []
+    for label, info in (old_citation_map or {}).items():
+        page = info.get("page") if isinstance(info, dict) else None
+        try:
+            page = int(page) if page else None
+        except (TypeError, ValueError):
+            page = None
+        if not page or page > len(old_hashes):
+            # Location unknown -> could be on any changed page
+            if changed_pages or removed_pages:
+                affected_fields.append(label)
+        elif old_hashes[page - 1] not in new_set:
+            # A field is unaffected only if the exact page it was cited from
+            # still exists somewhere in the new revision (pages may shift).
+            affected_fields.append(label)
+
+    return {
+        "changed_pages": changed_pages,
+        "removed_pages": removed_pages,
+        "affected_fields": affected_fields,
+    }
@@ -0,0 +1,129 @@
+"""
+Local candidate-page prefilter for extraction.
+
+Most pages of a contract contain no dates at all. Before uploading to Gemini
+we scan each page's text layer with cheap date / relative-date regexes, keep
+the matching pages plus some surrounding context, and build a reduced PDF of
+just those pages. The returned page map lets callers translate page numbers
+in the model's answer back to the original document.
+
+Pages without a text layer (scans, handwritten forms) are always kept, since
+we cannot tell locally whether they contain dates.
+"""
+import re
+
+MONTHS = (
+    r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|"
+    r"sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+)
+
+DATE_PATTERNS = [
+    # 12/03/2024, 12-03-24, 12.03.2024
+    re.compile(r"\b\d{1,2}\s*[/.-]\s*\d{1,2}\s*[/.-]\s*\d{2,4}\b"),
+    # 2024-03-12
+    re.compile(r"\b\d{4}-\d{1,2}-\d{1,2}\b"),
+    # 12 March 2024, 12th of March, 2024
+    re.compile(r"\b\d{1,2}(?:st|nd|rd|th)?\s+(?:of\s+)?" + MONTHS + r"\b", re.IGNORECASE),
+    # March 12, 2024
+    re.compile(r"\b" + MONTHS + r"\s+\d{1,2}(?:st|nd|rd|th)?\b", re.IGNORECASE),
+    # 3 days after, fourteen (14) business days from, within 7 days of
+    re.compile(
+        r"\b(?:\d+|[a-z]+(?:\s*\(\d+\))?)\s+(?:business\s+|working\s+|clear\s+|calendar\s+)?"
+        r"(?:days?|weeks?|months?)\s+(?:after|before|from|of|following|prior\s+to)\b",
+        re.IGNORECASE,
+    ),
+    # Named dates: "Settlement Date", "date of this contract", ...
+    re.compile(
+        r"\b(?:settlement|completion|contract|finance|cooling[- ]off|expiry|commencement|"
+        r"termination|due|sunset|possession)\s+date\b|\bdate\s+of\s+(?:this\s+)?(?:contract|agreement)\b",
+        re.IGNORECASE,
+    ),
+]
+
+# Pages with fewer non-space characters than this are treated as having no
+# text layer (image-only) and are always kept.
+MIN_TEXT_CHARS = 20
+
+def page_has_date(text):
+    """True if the page text contains a date or relative-date expression."""
+    return any(p.search(text) for p in DATE_PATTERNS)
+
+def extract_page_texts(pdf_path):
+    """Returns the text layer of every page (pypdf, no layout analysis)."""
+    from pypdf import PdfReader
+
+    texts = []
+    for page in PdfReader(pdf_path).pages:
+        try:
+            texts.append(page.extract_text() or "")
+        except Exception:
+            texts.append("")
+    return texts
+
+def select_candidate_pages(page_texts, context=1):
+    """
+    Picks the pages worth sending to the model.
+
+    Args:
+        page_texts: list of page text strings, in page order.
+        context: Number of neighbouring pages kept on each side of a hit, so
+            relative dates can still be resolved against nearby definitions.
+
+    Returns:
+        Sorted list of 0-based page indices.
+    """
+    total = len(page_texts)
+    selected = set()
+    for i, text in enumerate(page_texts):
+        no_text_layer = len("".join(text.split())) < MIN_TEXT_CHARS
+        if no_text_layer or page_has_date(text):
+            selected.update(range(max(0, i - context), min(total, i + context + 1)))
+    return sorted(selected)
+
+def reduced_page_list(page_texts, context=1, min_savings=0.2):
+    """
+    Decides which pages to send, given the text layer of every page.
+
+    Args:
+        min_savings: Minimum fraction of pages that must be dropped for a
+            reduced upload to be worth it.
+
+    Returns:
+        Sorted list of 0-based candidate page indices, or None if the whole
+        document should be sent (nothing to drop, or no candidates at all).
+    """
+    total = len(page_texts)
+    candidates = select_candidate_pages(page_texts, context=context)
+    if not candidates or total == 0 or (total - len(candidates)) / total < min_savings:
+        return None
+    return candidates
+
+def build_reduced_pdf(pdf_path, output_path, context=1, min_savings=0.2, page_texts=None):
+    """
+    Writes a PDF containing only the candidate pages of pdf_path.
+
+    Args:
+        min_savings: see reduced_page_list.
+        page_texts: Optional text layer of every page, if already extracted.
+
+    Returns:
+        page_map: list where page_map[i] is the 0-based original index of page
+        i of the reduced PDF, or None if no reduced PDF was written (nothing
+        to drop, or no candidates at all - then the full document is sent).
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    if page_texts is None:
+        page_texts = extract_page_texts(pdf_path)
+    candidates = reduced_page_list(page_texts, context=context, min_savings=min_savings)
+    if candidates is None:
+        return None
+
+    reader = PdfReader(pdf_path)
+    writer = PdfWriter()
+    for i in candidates:
+        writer.add_page(reader.pages[i])
+    writer.write(output_path)
+
+    print(f"Prefilter: sending {len(candidates)} of {len(page_texts)} pages")
+    return candidates
@@ -0,0 +1,206 @@
+"""
+Low-overhead sampling profiler for slow analyses.
+
+Each profiled run gets a background thread that periodically snapshots the
+stacks of the run's own threads (sys._current_frames, no tracing hooks) and
+counts identical stacks. The result is written in the "folded" format read
+by flamegraph.pl, speedscope and inferno:
+
+    thread;outer_func (file.py:12);inner_func (file.py:40) 17
+
+A run's threads are the thread that entered profile_run() plus any worker
+threads executing functions wrapped with propagate() (e.g. the chunk pool of
+extract_legal_data_chunked). Concurrent runs are sampled independently and
+each writes its own file. Profiled sections entered on a thread that already
+belongs to a run (extract_legal_data_hybrid inside an app analysis) are
+covered by that run and do not start a second sampler.
+
+Profiles are written as profile_<doc>_<timestamp>-<id>.folded next to the
+document's artifacts (or to LEGAL_VERIFIER_PROFILE_DIR) when:
+    - profiling is forced (LEGAL_VERIFIER_PROFILE=1 or the sidebar toggle), or
+    - the profiled run took longer than LEGAL_VERIFIER_PROFILE_THRESHOLD
+      seconds (default 120; 0 disables automatic capture).
+
+Environment:
+    LEGAL_VERIFIER_PROFILE            1 = always write a profile (default 0)
+    LEGAL_VERIFIER_PROFILE_THRESHOLD  auto-capture threshold in seconds (default 120)
+    LEGAL_VERIFIER_PROFILE_INTERVAL   sampling interval in seconds (default 0.01)
+    LEGAL_VERIFIER_PROFILE_DIR        directory for profiles (default: next to the document)
+"""
+import os
+import re
+import sys
+import time
+import uuid
+import inspect
+import functools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_ENABLED = os.environ.get("LEGAL_VERIFIER_PROFILE", "0") == "1"
+PROFILE_THRESHOLD = float(os.environ.get("LEGAL_VERIFIER_PROFILE_THRESHOLD", "120"))
+SAMPLE_INTERVAL = float(os.environ.get("LEGAL_VERIFIER_PROFILE_INTERVAL", "0.01"))
+PROFILE_DIR = os.environ.get("LEGAL_VERIFIER_PROFILE_DIR")
+
+# The profiler (if any) sampling the current thread
+_local = threading.local()
+
+class SamplingProfiler:
+    """Samples the stacks of the threads registered with add_thread()."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter() # folded stack -> samples
+        self.samples = 0
+        self._threads = {} # ident -> thread name
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_thread(self):
+        """Includes the calling thread in the samples."""
+        with self._lock:
+            self._threads[threading.get_ident()] = threading.current_thread().name
+
+    def remove_thread(self):
+        with self._lock:
+            self._threads.pop(threading.get_ident(), None)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="legal-verifier-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                threads = list(self._threads.items())
+            frames = sys._current_frames()
+            for ident, name in threads:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.stacks[f"{name};{self._fold(frame)}"] += 1
+            self.samples += 1
+
+    @staticmethod
+    def _fold(frame):
+        """Root-first "func (file:line)" frames of one stack."""
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(frames))
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class Capture:
+    """Outcome of profile_run(); path is set once a profile has been written."""
+
+    def __init__(self):
+        self.path = None
+        self.elapsed = None
+
+def _profile_path(out_dir, doc_name):
+    safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", os.path.splitext(os.path.basename(doc_name))[0])[:60]
+    # Random suffix: concurrent runs of the same document may finish in the same second
+    stamp = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    return os.path.join(out_dir, f"profile_{safe or 'document'}_{stamp}.folded")
+
+@contextmanager
+def profile_run(doc_name, out_dir, force=PROFILE_ENABLED, threshold=PROFILE_THRESHOLD):
+    """
+    Profiles the enclosed block (on this thread and threads joined via propagate()).
+
+    Args:
+        doc_name: Document name (or path) used in the profile file name.
+        out_dir: Directory the profile is written to (LEGAL_VERIFIER_PROFILE_DIR
+            takes precedence).
+        force: Write the profile regardless of how long the run took.
+        threshold: Write it anyway if the run took longer than this many
+            seconds (0 disables automatic capture).
+
+    Yields:
+        Capture; its path is set after the block if a profile was written.
+    """
+    capture = Capture()
+    if (not force and threshold <= 0) or getattr(_local, "profiler", None) is not None:
+        # Disabled, or this thread is already sampled by an enclosing run
+        yield capture
+        return
+
+    profiler = SamplingProfiler()
+    profiler.add_thread()
+    _local.profiler = profiler
+    start = time.perf_counter()
+    profiler.start()
+    try:
+        yield capture
+    finally:
+        profiler.stop()
+        profiler.remove_thread()
+        _local.profiler = None
+        capture.elapsed = time.perf_counter() - start
+        if force or capture.elapsed > threshold:
+            try:
+                path = _profile_path(PROFILE_DIR or out_dir, doc_name)
+                profiler.write(path)
+                capture.path = path
+                print(f"Profile ({profiler.samples} samples, {capture.elapsed:.1f}s) written to: {path}")
+            except Exception as e:
+                print(f"Error writing profile: {e}")
+
+def propagate(func):
+    """
+    Wraps func so that, when run on another thread (e.g. in a thread pool),
+    that thread is sampled by the calling thread's profile run, if any.
+    """
+    profiler = getattr(_local, "profiler", None)
+    if profiler is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_local, "profiler", None)
+        _local.profiler = profiler
+        profiler.add_thread()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.remove_thread()
+            _local.profiler = previous
+    return wrapper
+
+def profiled(doc_arg="pdf_path", dir_arg=None):
+    """
+    Decorator running the function under profile_run().
+
+    Args:
+        doc_arg: Name of the argument holding the document path (file name
+            of the profile, and its directory unless dir_arg is given).
+        dir_arg: Name of an argument holding a path whose directory the
+            profile is written to (e.g. the output PDF).
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if (not PROFILE_ENABLED and PROFILE_THRESHOLD <= 0) or getattr(_local, "profiler", None):
+                return func(*args, **kwargs)
+            arguments = signature.bind_partial(*args, **kwargs).arguments
+            doc_path = str(arguments.get(doc_arg) or func.__name__)
+            dir_path = str(arguments.get(dir_arg) or doc_path) if dir_arg else doc_path
+            out_dir = os.path.dirname(os.path.abspath(dir_path))
+            with profile_run(doc_path, out_dir):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
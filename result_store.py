@@ -0,0 +1,139 @@
+"""
+Persistent store for completed analyses.
+
+Keeps the extraction JSON, citation map and artifact pointers (highlighted
+PDF and split page files in temp_pdfs/) in a local SQLite database keyed by
+the SHA-256 of the uploaded file plus model and prompt version. Reopening a
+document after a browser refresh or server restart is then a single primary
+key lookup instead of a full re-analysis.
+"""
+import json
+import os
+import time
+
+from sqlite_util import connect
+
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser("~"), ".legal_verifier_results.db")
+
+class ResultStore:
+    """SQLite-backed store of analysis results keyed by document hash."""
+
+    def __init__(self, db_path=DEFAULT_STORE_PATH):
+        self.db_path = db_path
+        self._init_schema()
+
+    def _init_schema(self):
+        with connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    doc_hash TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    extracted_json TEXT NOT NULL,
+                    citation_json TEXT NOT NULL,
+                    highlighted_filename TEXT,
+                    page_base_name TEXT,
+                    total_pages INTEGER,
+                    created_at REAL,
+                    PRIMARY KEY (doc_hash, model, prompt_version)
+                )
+            """)
+            # Columns added after the first release of this table
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+            for name, decl in [("file_name", "TEXT"), ("page_hashes", "TEXT"), ("text_free_pages", "TEXT")]:
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE results ADD COLUMN {name} {decl}")
+            # page_hash -> documents containing it, to find earlier revisions
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS result_pages (
+                    page_hash TEXT NOT NULL,
+                    doc_hash TEXT NOT NULL,
+                    PRIMARY KEY (page_hash, doc_hash)
+                )
+            """)
+
+    def get(self, doc_hash, model, prompt_version):
+        """
+        Returns the stored result for this document/model/prompt, or None.
+
+        Returns:
+            dict {"doc_hash", "extracted_data", "citation_map", "highlighted_filename",
+                  "page_base_name", "total_pages", "created_at", "file_name", "page_hashes",
+                  "text_free_pages"}
+        """
+        with connect(self.db_path) as conn:
+            row = conn.execute(
+                f"SELECT {self._COLUMNS} FROM results "
+                "WHERE doc_hash = ? AND model = ? AND prompt_version = ?",
+                (doc_hash, model, prompt_version)
+            ).fetchone()
+        return self._row_to_result(row) if row else None
+
+    def find_previous_version(self, page_hashes, exclude_doc_hash=None):
+        """
+        Finds the stored document sharing the most pages with `page_hashes`
+        (i.e. the most likely earlier revision). Returns a result dict as in
+        get(), or None if no stored document shares a page.
+        """
+        unique = list(set(page_hashes))[:900]  # stay below SQLite's parameter limit
+        if not unique:
+            return None
+        placeholders = ",".join("?" for _ in unique)
+        with connect(self.db_path) as conn:
+            best = conn.execute(
+                f"SELECT doc_hash, COUNT(*) AS shared FROM result_pages "
+                f"WHERE page_hash IN ({placeholders}) AND doc_hash != ? "
+                "GROUP BY doc_hash ORDER BY shared DESC LIMIT 1",
+                unique + [exclude_doc_hash or ""]
+            ).fetchone()
+            if not best:
+                return None
+            row = conn.execute(
+                f"SELECT {self._COLUMNS} FROM results WHERE doc_hash = ? "
+                "ORDER BY created_at DESC LIMIT 1",
+                (best[0],)
+            ).fetchone()
+        return self._row_to_result(row) if row else None
+
+    _COLUMNS = (
+        "doc_hash, extracted_json, citation_json, highlighted_filename, page_base_name, "
+        "total_pages, created_at, file_name, page_hashes, text_free_pages"
+    )
+
+    @staticmethod
+    def _row_to_result(row):
+        return {
+            "doc_hash": row[0],
+            "extracted_data": json.loads(row[1]),
+            "citation_map": json.loads(row[2]),
+            "highlighted_filename": row[3],
+            "page_base_name": row[4],
+            "total_pages": row[5],
+            "created_at": row[6],
+            "file_name": row[7],
+            "page_hashes": json.loads(row[8]) if row[8] else [],
+            "text_free_pages": json.loads(row[9]) if row[9] else [],
+        }
+
+    def put(self, doc_hash, model, prompt_version, extracted_data, citation_map,
+            highlighted_filename=None, page_base_name=None, total_pages=None,
+            file_name=None, page_hashes=None, text_free_pages=None):
+        """Stores (or replaces) the result for this document/model/prompt."""
+        with connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (doc_hash, model, prompt_version, extracted_json, "
+                "citation_json, highlighted_filename, page_base_name, total_pages, created_at, "
+                "file_name, page_hashes, text_free_pages) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    doc_hash, model, prompt_version,
+                    json.dumps(extracted_data), json.dumps(citation_map),
+                    highlighted_filename, page_base_name, total_pages, time.time(),
+                    file_name, json.dumps(page_hashes or []), json.dumps(text_free_pages or [])
+                )
+            )
+            if page_hashes:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO result_pages (page_hash, doc_hash) VALUES (?, ?)",
+                    [(h, doc_hash) for h in set(page_hashes)]
+                )
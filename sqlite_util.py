@@ -0,0 +1,17 @@
+"""
+Shared SQLite helpers for the local stores (corpus index, result store,
+page cache).
+"""
+import sqlite3
+from contextlib import contextmanager
+
+@contextmanager
+def connect(db_path):
+    """Opens db_path for one operation; commits on success, rolls back on error."""
+    # A connection per operation: Streamlit reruns on different threads.
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
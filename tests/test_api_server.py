@@ -0,0 +1,115 @@
+"""Round trips through the headless API with extraction and highlighting stubbed."""
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import api_server
+from page_cache import PageCache
+
+PDF = b"%PDF-1.4\n% stub\n"
+EXTRACTED = {"Contract Date": {"value": "01-03-2024", "verbatim_quote": "1 March 2024", "page_number": 1}}
+CITATIONS = {"Contract Date": {"page": 1, "status": "verified"}}
+
+@pytest.fixture
+def release(monkeypatch, tmp_path):
+    """Stubs the analysis; jobs block until the returned event is set."""
+    event = threading.Event()
+
+    def fake_extract(pdf_path, api_key=None):
+        event.wait(5)
+        return json.dumps(EXTRACTED)
+
+    def fake_highlight(pdf_path, output_path, evidence, page_cache=None, text_free_pages=None):
+        with open(output_path, "wb") as f:
+            f.write(PDF)
+        return CITATIONS
+
+    monkeypatch.setattr(api_server, "extract_legal_data_hybrid", fake_extract)
+    monkeypatch.setattr(api_server, "highlight_evidence_pure", fake_highlight)
+    monkeypatch.setattr(api_server, "PageCache", lambda: PageCache(str(tmp_path / "pages.db")))
+    yield event
+    event.set()
+
+def _serve(tmp_path, workers=1, max_queue=0, max_upload_bytes=1024, api_token=None):
+    manager = api_server.JobManager(workers=workers, max_queue=max_queue, jobs_dir=str(tmp_path / "jobs"))
+    handler = api_server.make_handler(manager, max_upload_bytes, api_token=api_token)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def _request(url, body=None, headers=None):
+    """Returns (status, headers, body) without raising on error statuses."""
+    request = urllib.request.Request(url, data=body, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+def _wait_for(base, job_id, status):
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        job = json.loads(_request(f"{base}/jobs/{job_id}")[2])
+        if job["status"] == status:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} never reached {status}")
+
+def test_job_lifecycle(release, tmp_path):
+    server, base = _serve(tmp_path)
+    try:
+        status, headers, body = _request(f"{base}/jobs", PDF)
+        assert status == 202
+        job_id = json.loads(body)["job_id"]
+        assert headers["Location"] == f"/jobs/{job_id}"
+
+        _wait_for(base, job_id, "running")
+        assert _request(f"{base}/jobs/{job_id}/result")[0] == 409
+
+        release.set()
+        _wait_for(base, job_id, "done")
+        status, _, body = _request(f"{base}/jobs/{job_id}/result")
+        assert status == 200
+        assert json.loads(body) == {
+            "extracted_data": EXTRACTED, "citation_map": CITATIONS, "text_free_pages": [],
+        }
+        status, headers, body = _request(f"{base}/jobs/{job_id}/pdf")
+        assert (status, headers["Content-Type"], body) == (200, "application/pdf", PDF)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_full_queue_is_rejected_with_429(release, tmp_path):
+    server, base = _serve(tmp_path, workers=1, max_queue=0)
+    try:
+        assert _request(f"{base}/jobs", PDF)[0] == 202
+        status, headers, _ = _request(f"{base}/jobs", PDF)
+        assert status == 429
+        assert headers["Retry-After"] == "5"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_oversized_upload_is_rejected_with_413(release, tmp_path):
+    server, base = _serve(tmp_path, max_upload_bytes=len(PDF) - 1)
+    try:
+        assert _request(f"{base}/jobs", PDF)[0] == 413
+        assert json.loads(_request(f"{base}/health")[2])["queued"] == 0
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_bearer_token_is_required(release, tmp_path):
+    server, base = _serve(tmp_path, api_token="secret")
+    try:
+        assert _request(f"{base}/health")[0] == 401
+        assert _request(f"{base}/health", headers={"Authorization": "Bearer wrong"})[0] == 401
+        assert _request(f"{base}/health", headers={"Authorization": "Bearer secret"})[0] == 200
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,30 @@
+"""Merging of local and Gemini results in extract_legal_data_hybrid."""
+import json
+
+import legal_extraction
+
+TEXT = "Contract Date: 01/03/2024\nFinance Date: 3 weeks after the Contract Date\n"
+
+def _run(monkeypatch, llm_result):
+    monkeypatch.setattr(legal_extraction, "extract_page_texts", lambda path: [TEXT])
+    monkeypatch.setattr(
+        legal_extraction, "extract_legal_data_chunked",
+        lambda *args, **kwargs: json.dumps(llm_result)
+    )
+    return json.loads(legal_extraction.extract_legal_data_hybrid("contract.pdf", api_key="key"))
+
+def test_gemini_value_wins_on_conflict(monkeypatch):
+    data = _run(monkeypatch, {
+        "Contract Date": {"value": "02-03-2024", "verbatim_quote": "q", "page_number": 1},
+        "Finance Date": {"value": "22-03-2024", "verbatim_quote": "q", "page_number": 1},
+    })
+    assert data["Contract Date"]["value"] == "02-03-2024"
+    assert data["Finance Date"]["value"] == "22-03-2024"
+
+def test_local_value_fills_fields_gemini_left_empty(monkeypatch):
+    data = _run(monkeypatch, {
+        "contract date": {"value": None, "verbatim_quote": None, "page_number": 1},
+        "Finance Date": {"value": "22-03-2024", "verbatim_quote": "q", "page_number": 1},
+    })
+    assert data["Contract Date"]["value"] == "01-03-2024"
+    assert "contract date" not in data
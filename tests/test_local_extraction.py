@@ -0,0 +1,136 @@
+"""Date arithmetic and unresolved-field reporting of the rule-based extractor."""
+from datetime import date
+
+from local_extraction import add_days, extract_dates_locally, has_unexplained_dates
+
+def test_add_calendar_days():
+    assert add_days(date(2024, 3, 1), 42) == date(2024, 4, 12)
+    assert add_days(date(2024, 3, 1), -1) == date(2024, 2, 29)
+
+def test_add_business_days_skips_weekends():
+    # Friday + 1 business day -> Monday
+    assert add_days(date(2024, 3, 1), 1, business=True, holidays=set()) == date(2024, 3, 4)
+    # Monday + 5 business days -> next Monday
+    assert add_days(date(2024, 3, 4), 5, business=True, holidays=set()) == date(2024, 3, 11)
+
+def test_add_business_days_skips_holidays():
+    holidays = {date(2024, 3, 29), date(2024, 4, 1)}  # Good Friday, Easter Monday
+    assert add_days(date(2024, 3, 28), 1, business=True, holidays=holidays) == date(2024, 4, 2)
+
+def test_subtract_business_days():
+    # Monday - 1 business day -> Friday
+    assert add_days(date(2024, 3, 4), -1, business=True, holidays=set()) == date(2024, 3, 1)
+
+def test_relative_dates_are_resolved():
+    text = (
+        "Contract Date: 01/03/2024\n"
+        "Settlement Date: 42 days after the Contract Date\n"
+        "Finance Date: fourteen (14) business days after the Contract Date\n"
+    )
+    resolved, unresolved = extract_dates_locally([text], holidays=set())
+    assert resolved["Contract Date"]["value"] == "01-03-2024"
+    assert resolved["Settlement Date"]["value"] == "12-04-2024"
+    assert resolved["Finance Date"]["value"] == "21-03-2024"
+    assert unresolved == []
+
+def test_relative_date_chain():
+    text = (
+        "Contract Date: 01/03/2024\n"
+        "Finance Date: 10 days after the Contract Date\n"
+        "Settlement Date: 5 days after the Finance Date\n"
+    )
+    resolved, _ = extract_dates_locally([text])
+    assert resolved["Settlement Date"]["value"] == "16-03-2024"
+
+def test_relative_date_before():
+    text = "Settlement Date: 30/04/2024\nInspection Date: 7 days before the Settlement Date\n"
+    resolved, _ = extract_dates_locally([text])
+    assert resolved["Building and Pest Inspection Date"]["value"] == "23-04-2024"
+
+def test_conflicting_statements_are_left_unresolved():
+    text = (
+        "Contract Date: 01/03/2024\n"
+        "Completion Date: 01/05/2024\n"
+        "Settlement Date: 42 days after the Contract Date\n"
+    )
+    resolved, unresolved = extract_dates_locally([text])
+    assert "Settlement Date" not in resolved
+    assert "Settlement Date" in unresolved
+
+def test_labels_without_parsable_value_are_unresolved():
+    text = (
+        "Contract Date: 01/03/2024\n"
+        "Settlement Date: 42 days after the Contract Date\n"
+        "Finance Date: 3 weeks after the Contract Date\n"
+        "Sunset Date: 01/09/2024\n"
+        "Deposit due within 7 days of the date of this contract\n"
+    )
+    resolved, unresolved = extract_dates_locally([text])
+    assert set(resolved) == {"Contract Date", "Settlement Date"}
+    assert set(unresolved) == {"Finance Date", "Deposit Due Date"}
+    # Sunset Date is not a known label: the leftover date keeps the LLM in play
+    assert has_unexplained_dates([text], resolved)
+
+CONTRACT = [
+    # Particulars
+    "CONTRACT FOR THE SALE AND PURCHASE OF LAND\n"
+    "Vendor: A. Smith  Purchaser: B. Jones\n"
+    "Contract Date: 01/03/2024\n"
+    "Settlement Date: 42 days after the Contract Date\n"
+    "Price: $850,000  Deposit: $85,000\n",
+    # Standard conditions mentioning the labels many times
+    "1. Settlement\n"
+    "1.1 The Purchaser must pay the balance of the Price on the Settlement Date.\n"
+    "1.2 If the Settlement Date falls on a day that is not a business day, settlement\n"
+    "takes place on the next business day. Clause 3 may be varied by agreement.\n"
+    "2. Notices\n"
+    "2.1 A party may serve a notice to complete within 14 days after service of a\n"
+    "notice of default. Time is of the essence in relation to the Settlement Date.\n"
+    "3.1.2 The Vendor must give vacant possession on the Settlement Date.\n",
+]
+
+def test_realistic_contract_is_fully_explained():
+    resolved, unresolved = extract_dates_locally(CONTRACT)
+    assert set(resolved) == {"Contract Date", "Settlement Date"}
+    assert unresolved == []
+    assert not has_unexplained_dates(CONTRACT, resolved)
+
+def test_extra_date_in_realistic_contract_is_unexplained():
+    pages = CONTRACT + ["Special condition: the Sunset Date is 01/09/2024.\n"]
+    resolved, _ = extract_dates_locally(pages)
+    assert has_unexplained_dates(pages, resolved)
+
+def test_extra_relative_date_in_realistic_contract_is_unexplained():
+    pages = CONTRACT + ["The balance of the deposit is payable 7 days after the Finance Date.\n"]
+    resolved, _ = extract_dates_locally(pages)
+    assert has_unexplained_dates(pages, resolved)
+
+def test_whichever_is_later_is_left_unresolved():
+    text = (
+        "Contract Date: 01/03/2024\n"
+        "Settlement Date: 42 days after the Contract Date or 15/06/2024, whichever is later\n"
+    )
+    resolved, unresolved = extract_dates_locally([text])
+    assert "Settlement Date" not in resolved
+    assert unresolved == ["Settlement Date"]
+
+def test_later_of_is_left_unresolved():
+    text = (
+        "Contract Date: 01/03/2024\n"
+        "Settlement Date: the later of 30/04/2024 and 42 days after the Contract Date\n"
+    )
+    resolved, unresolved = extract_dates_locally([text])
+    assert "Settlement Date" not in resolved
+    assert unresolved == ["Settlement Date"]
+
+def test_subject_to_is_left_unresolved():
+    text = "Contract Date: 01/03/2024\nSettlement Date: 30/04/2024 subject to clause 7\n"
+    resolved, unresolved = extract_dates_locally([text])
+    assert "Settlement Date" not in resolved
+    assert unresolved == ["Settlement Date"]
+
+def test_labels_on_one_line_keep_their_own_values():
+    resolved, unresolved = extract_dates_locally(["Contract Date: 01/03/2024 Settlement Date: 30/04/2024"])
+    assert resolved["Contract Date"]["value"] == "01-03-2024"
+    assert resolved["Settlement Date"]["value"] == "30-04-2024"
+    assert unresolved == []
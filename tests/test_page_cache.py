@@ -0,0 +1,20 @@
+"""The page cache must stay bounded."""
+from page_cache import PageCache
+
+def test_least_recently_used_pages_are_evicted(tmp_path, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr("page_cache.time.time", lambda: next(clock))
+    cache = PageCache(str(tmp_path / "pages.db"), max_pages=2)
+
+    cache.put_many({"a": {"text": "a"}})
+    cache.put_many({"b": {"text": "b"}})
+    cache.get_many(["a"])  # a is now more recently used than b
+    cache.put_many({"c": {"text": "c"}})
+
+    assert sorted(cache.get_many(["a", "b", "c"])) == ["a", "c"]
+
+def test_matches_per_page_are_capped(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.db"), max_matches=2)
+    cache.put_many({"a": {"text": "a", "matches": {"q1": [0], "q2": [1], "q3": [2]}}})
+
+    assert cache.get_many(["a"])["a"]["matches"] == {"q2": [1], "q3": [2]}
@@ -0,0 +1,54 @@
+"""Page hashes must tell apart pages that only differ inside form XObjects."""
+import fitz  # PyMuPDF
+import pytest
+from pypdf import PdfReader
+
+from highlight_evidence_pure import highlight_evidence_pure, page_content_hash
+from page_cache import PageCache
+
+def _make_form_pdf(path, lines):
+    """Writes a PDF whose pages draw their text through a form XObject
+    (show_pdf_page, as pdfpages/pdfjam do), so every page's own content
+    stream is just "q /fzFrm0 Do Q"."""
+    src = fitz.open()
+    for line in lines:
+        src.new_page().insert_text((72, 72), line)
+    out = fitz.open()
+    for i in range(len(lines)):
+        out.new_page().show_pdf_page(out[-1].rect, src, i)
+    out.save(str(path))
+
+@pytest.fixture
+def form_pdfs(tmp_path):
+    a = tmp_path / "a.pdf"
+    b = tmp_path / "b.pdf"
+    _make_form_pdf(a, ["Nothing here", "Nothing here"])
+    _make_form_pdf(b, ["Settlement Date: 01/05/2024", "Purchaser signature"])
+    return a, b
+
+def test_form_pages_hash_differently(form_pdfs):
+    a, b = form_pdfs
+    hashes_a = [page_content_hash(p) for p in PdfReader(a).pages]
+    hashes_b = [page_content_hash(p) for p in PdfReader(b).pages]
+    assert not set(hashes_a) & set(hashes_b)
+    assert hashes_b[0] != hashes_b[1]
+
+def test_identical_pages_hash_the_same(form_pdfs):
+    a, _ = form_pdfs
+    hashes = [page_content_hash(p) for p in PdfReader(a).pages]
+    assert hashes[0] == hashes[1]
+
+def test_shared_cache_does_not_leak_between_documents(form_pdfs, tmp_path):
+    a, b = form_pdfs
+    cache = PageCache(str(tmp_path / "pages.db"))
+    evidence = [{"label": "Settlement Date", "quote": "Settlement Date: 01/05/2024", "gemini_page": None}]
+
+    highlight_evidence_pure(str(a), str(tmp_path / "a_out.pdf"), evidence,
+                            page_cache=cache, optimize=False)
+    page_texts = []
+    citations = highlight_evidence_pure(str(b), str(tmp_path / "b_out.pdf"), evidence,
+                                        page_texts=page_texts, page_cache=cache, optimize=False)
+
+    assert citations["Settlement Date"] == {"page": 1, "status": "verified"}
+    assert "Settlement Date" in page_texts[0]
+    assert "Purchaser signature" in page_texts[1]
@@ -0,0 +1,49 @@
+"""Concurrent profiled runs must each get their own profile."""
+import threading
+import time
+
+from profiling import profile_run, propagate
+
+def _busy(seconds=0.1):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(1000))
+
+def _threads_in(path):
+    with open(path) as f:
+        return {line.split(";", 1)[0] for line in f}
+
+def test_concurrent_forced_runs_write_separate_profiles(tmp_path):
+    paths = {}
+
+    def run(name):
+        with profile_run(name, str(tmp_path), force=True) as capture:
+            _busy()
+        paths[name] = capture.path
+
+    threads = [threading.Thread(target=run, args=(name,), name=name) for name in ("docA", "docB")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert paths["docA"] and paths["docB"] and paths["docA"] != paths["docB"]
+    assert _threads_in(paths["docA"]) == {"docA"}
+    assert _threads_in(paths["docB"]) == {"docB"}
+
+def test_nested_runs_and_propagated_workers_share_one_profile(tmp_path):
+    with profile_run("outer", str(tmp_path), force=True) as outer:
+        with profile_run("inner", str(tmp_path), force=True) as inner:
+            worker = threading.Thread(target=propagate(_busy), name="worker")
+            worker.start()
+            _busy()
+            worker.join()
+
+    assert inner.path is None
+    assert _threads_in(outer.path) == {"MainThread", "worker"}
+
+def test_fast_run_below_threshold_writes_nothing(tmp_path):
+    with profile_run("fast", str(tmp_path), force=False, threshold=60) as capture:
+        pass
+    assert capture.path is None
+    assert not list(tmp_path.iterdir())